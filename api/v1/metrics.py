@@ -0,0 +1,26 @@
+from flask import Response
+from tools import api_tools
+
+from ...helpers.metrics import registry
+
+
+class ProjectAPI(api_tools.APIModeHandler):
+    ...
+
+class AdminAPI(api_tools.APIModeHandler):
+    ...
+
+
+class API(api_tools.APIBase):
+    url_params = [
+        '',
+        '<string:mode>',
+    ]
+
+    mode_handlers = {
+        'default': ProjectAPI,
+        'administration': AdminAPI,
+    }
+
+    def get(self, **kwargs):
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
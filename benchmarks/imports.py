@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    Import time and RSS of plugin entry points
+
+    Every scenario runs in a fresh interpreter, so nothing is shared through
+    sys.modules. Reports wall time, RSS growth and which heavy SDK modules
+    got loaded, to check that utils stays cheap until warm_up() or the first
+    direct prediction.
+
+    python benchmarks/imports.py
+    python benchmarks/imports.py --output benchmarks/imports.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCH_DIR)
+PACKAGE_NAME = "vertex_ai"
+HEAVY_MODULES = ("vertexai", "vertexai.language_models", "google.cloud.aiplatform", "tiktoken")
+
+SCENARIOS = {
+    "callbacks": f"importlib.import_module('{PACKAGE_NAME}.methods.callbacks')",
+    "rpc": f"importlib.import_module('{PACKAGE_NAME}.rpc.main')",
+    "utils": f"importlib.import_module('{PACKAGE_NAME}.utils')",
+    "utils+warm_up": f"importlib.import_module('{PACKAGE_NAME}.utils').warm_up()",
+    "vertexai.language_models": "importlib.import_module('vertexai.language_models')",
+}
+
+PROBE = """
+import importlib, json, sys, time, types
+
+def rss_kb():
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+package = types.ModuleType({package!r})
+package.__path__ = [{plugin_dir!r}]
+sys.modules[{package!r}] = package
+rss_before = rss_kb()
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_kb": rss_kb() - rss_before,
+    "heavy_modules": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_scenario(statement, repeat):
+    """ Median of repeat fresh-interpreter runs """
+    code = PROBE.format(
+        package=PACKAGE_NAME, plugin_dir=PLUGIN_DIR, statement=statement, heavy=HEAVY_MODULES,
+    )
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=False,
+        )
+        if completed.returncode:
+            return {"error": completed.stderr.strip().splitlines()[-1]}
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    runs.sort(key=lambda item: item["seconds"])
+    return runs[len(runs) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "imports.json"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    #
+    results = {}
+    for name, statement in SCENARIOS.items():
+        results[name] = result = run_scenario(statement, args.repeat)
+        if "error" in result:
+            print(f"{name:<28} failed: {result['error']}")
+            continue
+        print(
+            f"{name:<28} {result['seconds'] * 1000:>10.1f} ms {result['rss_kb'] / 1024:>10.1f} MB"
+            f"  {', '.join(result['heavy_modules']) or '-'}"
+        )
+    #
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    Micro-benchmarks of the request preparation hot path
+
+    Runs offline against fixed synthetic corpora. Needs the plugin runtime
+    dependencies (pylon, tools, pydantic, vertexai, tiktoken with cached
+    cl100k_base data) to be importable.
+
+    python benchmarks/run.py                      # run, compare with baseline.json
+    python benchmarks/run.py --save-baseline      # run, store results as baseline
+    python benchmarks/run.py --only prepare_conversation
+"""
+
+import argparse
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import timeit
+import types
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCH_DIR)
+PACKAGE_NAME = "vertex_ai"
+
+HISTORY_SIZES = (10, 100, 500, 1000, 5000)
+SEED = 20240101
+WORDS = (
+    "vertex model token request response stream chat history prompt context example "
+    "latency cache region quota embedding budget assistant user system answer question "
+    "the a of to and in is it for on with as be at by this that from"
+).split()
+
+
+def load_plugin():
+    """ Import plugin as a package without running its pylon module entry point """
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PLUGIN_DIR]
+    sys.modules[PACKAGE_NAME] = package
+    return (
+        importlib.import_module(f"{PACKAGE_NAME}.utils"),
+        importlib.import_module(f"{PACKAGE_NAME}.models.request_body"),
+        importlib.import_module(f"{PACKAGE_NAME}.methods.callbacks"),
+    )
+
+
+def sentence(rng, min_words=5, max_words=60):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def make_corpus(history_size):
+    """ Deterministic chat corpus with history_size messages """
+    rng = random.Random(SEED + history_size)
+    messages = [{"role": "system", "content": sentence(rng, 50, 200)}]
+    for _ in range(3):
+        messages.append({"role": "system", "name": "example_user", "content": sentence(rng)})
+        messages.append({"role": "system", "name": "example_assistant", "content": sentence(rng)})
+    for idx in range(history_size):
+        messages.append({"role": "user" if idx % 2 == 0 else "assistant", "content": sentence(rng)})
+    messages.append({"role": "user", "content": sentence(rng)})
+    return messages
+
+
+def measure(func, repeat=5):
+    """ Per-call time in microseconds: min and median over repeat runs """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    runs = [elapsed / number * 1e6 for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return {"min_us": min(runs), "median_us": statistics.median(runs), "number": number}
+
+
+def cold(func):
+    """ func run with an empty token count cache, so real tokenization is measured """
+    tokenizer = importlib.import_module(f"{PACKAGE_NAME}.helpers.tokenizer")
+    #
+    def _cold():
+        tokenizer._token_counts.invalidate()  # pylint: disable=W0212
+        return func()
+    #
+    return _cold
+
+
+def build_cases(utils, request_body, callbacks):
+    """ name -> zero-argument callable; token counting cases come as warm (cache hits) and cold """
+    cases = {}
+    #
+    for size in HISTORY_SIZES:
+        messages = make_corpus(size)
+        prompt_struct = {
+            "context": messages[0]["content"],
+            "examples": [
+                {"input": messages[idx]["content"], "output": messages[idx + 1]["content"]}
+                for idx in range(1, 7, 2)
+            ],
+            "chat_history": messages[7:-1],
+            "prompt": messages[-1]["content"],
+        }
+        cases[f"prepare_conversation[{size}]"] = (
+            lambda ps=prompt_struct: utils.prepare_conversation(ps, 32000)
+        )
+        cases[f"prepare_conversation[{size},cold]"] = cold(cases[f"prepare_conversation[{size}]"])
+        request_data = {
+            "deployment_id": "chat-bison", "stream": False, "messages": messages,
+            "temperature": 0.2, "max_tokens": 256,
+        }
+        cases[f"ChatCompletionRequestBody.validate[{size}]"] = (
+            lambda rd=request_data: request_body.ChatCompletionRequestBody.validate(rd)
+        )
+        cases[f"parse_chat_request[{size}]"] = (
+            lambda rd=request_data: request_body.parse_chat_request(rd)
+        )
+        cases[f"num_tokens_from_messages[{size}]"] = (
+            lambda items=messages: [utils.num_tokens_from_messages(item) for item in items]
+        )
+        cases[f"num_tokens_from_messages[{size},cold]"] = cold(cases[f"num_tokens_from_messages[{size}]"])
+    #
+    rng = random.Random(SEED)
+    completion = {"prompt": sentence(rng, 200, 400), "max_tokens": 256, "temperature": 0.0}
+    cases["CompletionRequestBody.validate"] = (
+        lambda: request_body.CompletionRequestBody.validate(completion)
+    )
+    text = sentence(rng, 200, 400)
+    cases["prepare_azure_response[stream]"] = (
+        lambda: utils.prepare_azure_response(model_name="chat-bison", text=text, stream=True, chat=True)
+    )
+    cases["prepare_azure_response[non-stream]"] = (
+        lambda: utils.prepare_azure_response(
+            model_name="chat-bison", text=text, input_token_usage=1000, output_token_usage=200,
+            stream=False, chat=True,
+        )
+    )
+    #
+    method = callbacks.Method()
+    integration_settings = {
+        "project": "bench-project", "zone": "us-central1",
+        "service_account_info": "{}", "models": [],
+    }
+    plain_settings = dict(integration_settings, model_name="text-bison")
+    embedding_settings = {
+        "model_name": "textembedding-gecko",
+        "integration_data": {"settings": integration_settings},
+    }
+    cases["callback.ai_check_settings"] = lambda: method.ai_check_settings(plain_settings)
+    cases["callback.ai_get_models"] = lambda: method.ai_get_models(plain_settings)
+    cases["callback.embed_documents"] = lambda: method.embed_documents(embedding_settings, [text] * 16)
+    cases["callback.embed_query"] = lambda: method.embed_query(embedding_settings, text)
+    return cases
+
+
+def compare(results, baseline, threshold):
+    """ Names of cases slower than baseline by more than threshold """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_us"] / baseline[name]["median_us"]
+        result["baseline_ratio"] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default=None, help="run cases whose name contains this string")
+    args = parser.parse_args()
+    #
+    cases = build_cases(*load_plugin())
+    results = {}
+    for name, func in cases.items():
+        if args.only and args.only not in name:
+            continue
+        func()  # lazy imports; warm cases also fill the token count cache here
+        results[name] = measure(func, args.repeat)
+        print(f"{name:<50} {results[name]['median_us']:>14.1f} us")
+    #
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+    #
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"results": results, "regressions": regressions}, file, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    #
+    for name in regressions:
+        print(f"REGRESSION {name}: {results[name]['baseline_ratio']:.2f}x baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Local admission control matched to Vertex AI quotas """
+
+import asyncio
+import threading
+import time
+
+
+class AdmissionRejected(RuntimeError):
+    """ Request would exceed local quota before its deadline """
+
+
+class TokenBucket:
+    """ Bucket of capacity tokens refilled evenly over a minute """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        # now may predate a bucket created after it was read
+        self.tokens = min(self.capacity, self.tokens + max(now - self.updated, 0) * self.rate)
+        self.updated = max(now, self.updated)
+
+    def wait_time(self, amount, now) -> float:
+        """ Seconds until amount (capped at capacity) is available """
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(missing, 0) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class AdmissionController:
+    """ Requests/min and tokens/min buckets per (GCP project, region, model) """
+
+    def __init__(self):
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self._buckets = {}
+        self._condition = threading.Condition()
+
+    def _get_buckets(self, key, rpm, tpm):
+        buckets = self._buckets.get(key)
+        if buckets is None or buckets[0] != (rpm, tpm):
+            buckets = ((rpm, tpm), TokenBucket(rpm) if rpm else None, TokenBucket(tpm) if tpm else None)
+            self._buckets[key] = buckets
+        return buckets[1:]
+
+    def _attempt(self, key, rpm, tpm, tokens, deadline, waited) -> float:
+        """ Take quota and return 0, or return seconds to wait; caller holds _condition """
+        now = time.monotonic()
+        requests, token_bucket = self._get_buckets(key, rpm, tpm)
+        wait = max(
+            requests.wait_time(1, now) if requests else 0,
+            token_bucket.wait_time(tokens, now) if token_bucket else 0,
+        )
+        if wait <= 0:
+            if requests:
+                requests.take(1)
+            if token_bucket:
+                token_bucket.take(tokens)
+            self.admitted += 1
+            return 0.0
+        if now + wait > deadline:
+            self.rejected += 1
+            raise AdmissionRejected(
+                f"Local quota exceeded for {'/'.join(map(str, key))}, retry in {wait:.1f}s"
+            )
+        if not waited:
+            self.queued += 1
+        return wait
+
+    def acquire(self, key, rpm=None, tpm=None, tokens=0, timeout=0.0):
+        """ Take one request and tokens from buckets, waiting up to timeout seconds """
+        if not rpm and not tpm:
+            return
+        deadline = time.monotonic() + timeout
+        waited = False
+        with self._condition:
+            while True:
+                wait = self._attempt(key, rpm, tpm, tokens, deadline, waited)
+                if not wait:
+                    return
+                waited = True
+                self._condition.wait(wait)
+
+    async def acquire_async(self, key, rpm=None, tpm=None, tokens=0, timeout=0.0):
+        """ acquire() that sleeps on the event loop instead of blocking a thread """
+        if not rpm and not tpm:
+            return
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            with self._condition:
+                wait = self._attempt(key, rpm, tpm, tokens, deadline, waited)
+            if not wait:
+                return
+            waited = True
+            await asyncio.sleep(wait)
+
+    def info(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "keys": len(self._buckets),
+        }
+
+
+admission = AdmissionController()
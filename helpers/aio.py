@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Shared asyncio event loop """
+
+import asyncio
+import threading
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+
+class EventLoopThread:
+    """ Event loop running forever in a daemon thread """
+
+    def __init__(self, name):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """ Running loop, started on first use """
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(
+                        target=loop.run_forever, name=self.name, daemon=True,
+                    )
+                    self._thread.start()
+                    self._loop = loop
+                    log.info("Started event loop %s", self.name)
+        return self._loop
+
+    def submit(self, coro):
+        """ Schedule coroutine on the loop, returns concurrent.futures.Future """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """ Run coroutine on the loop and wait for its result """
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        """ Stop the loop and wait for its thread """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+
+event_loop = EventLoopThread("vertex_ai-aio")
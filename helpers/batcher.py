@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Cross-request micro-batching """
+
+import threading
+from concurrent.futures import Future
+
+
+class _Batch:  # pylint: disable=R0903
+    def __init__(self, handler):
+        self.handler = handler
+        self.items = []
+        self.futures = []
+        self.timer = None
+
+
+class MicroBatcher:
+    """ Collects concurrent submits with the same key into one handler(items) call """
+
+    def __init__(self, max_wait=0.005, max_batch_size=32):
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.items = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def configure(self, max_wait=None, max_batch_size=None):
+        """ Change batching window (seconds) and batch size limit """
+        if max_wait is not None:
+            self.max_wait = max_wait
+        if max_batch_size is not None:
+            self.max_batch_size = max_batch_size
+
+    def submit(self, key, item, handler, timeout=None):
+        """
+            Add item to the pending batch of key and wait for its result
+
+            Batch is flushed after max_wait or once it has max_batch_size items,
+            handler of the first submit in batch is used for the whole batch
+        """
+        future = Future()
+        full_batch = None
+        with self._lock:
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = _Batch(handler)
+                self._pending[key] = batch
+                if self.max_wait > 0:
+                    batch.timer = threading.Timer(self.max_wait, self._flush, (key, batch))
+                    batch.timer.daemon = True
+                    batch.timer.start()
+            batch.items.append(item)
+            batch.futures.append(future)
+            if len(batch.items) >= self.max_batch_size or batch.timer is None:
+                del self._pending[key]
+                if batch.timer is not None:
+                    batch.timer.cancel()
+                full_batch = batch
+        if full_batch is not None:
+            self._run(full_batch)
+        return future.result(timeout)
+
+    def _flush(self, key, batch):
+        with self._lock:
+            if self._pending.get(key) is not batch:
+                return
+            del self._pending[key]
+        self._run(batch)
+
+    def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch.items)
+        try:
+            results = batch.handler(batch.items)
+            if len(results) != len(batch.items):
+                raise RuntimeError(f"Expected {len(batch.items)} results, got {len(results)}")
+        except Exception as e:  # pylint: disable=W0718
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(batch.futures, results):
+            future.set_result(result)
+
+    def info(self) -> dict:
+        """ Batching statistics """
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_wait": self.max_wait,
+            "max_batch_size": self.max_batch_size,
+        }
+
+
+embed_query_batcher = MicroBatcher()
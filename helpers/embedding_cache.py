@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Content-addressed embedding cache """
+
+import fcntl
+import hashlib
+import mmap
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from array import array
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+
+EMBEDDING_CACHE_DIR = os.path.join(tempfile.gettempdir(), "vertex_ai_embeddings")
+EMBEDDING_STORE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def text_key(text: str) -> str:
+    """ Content hash of embedded text """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ModelVectorStore:
+    """ Vectors of one model: sqlite index + memory-mapped float32 rows,
+    emptied when an append would grow the vector file past max_bytes """
+
+    def __init__(self, path, max_bytes=EMBEDDING_STORE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._index = sqlite3.connect(
+            os.path.join(path, "index.sqlite"), check_same_thread=False, isolation_level=None,
+        )
+        self._index.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)"
+        )
+        self._index.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._mmap_size = 0
+        self.dim = self._get_dim()
+
+    def _get_dim(self):
+        row = self._index.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        return row[0] if row else None
+
+    def _view(self, size):
+        """ Memory map covering at least size bytes """
+        if self._mmap is None or self._mmap_size < size:
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self._vectors_path, "rb") as file:
+                self._mmap_size = os.fstat(file.fileno()).st_size
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def get_many(self, keys):
+        """ Vectors for keys, None where missing """
+        if self.dim is None or not keys:
+            return [None] * len(keys)
+        rows = {}
+        unique = list(set(keys))
+        with self._lock, open(self._vectors_path, "rb") as file:
+            # shared lock: another process may reset the store while rows are read
+            fcntl.flock(file, fcntl.LOCK_SH)
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows.update(self._index.execute(
+                    f"SELECT key, row FROM vectors WHERE key IN ({','.join('?' * len(chunk))})", chunk,
+                ).fetchall())
+            if not rows:
+                return [None] * len(keys)
+            row_size = self.dim * 4
+            view = self._view((max(rows.values()) + 1) * row_size)
+            vectors = {}
+            for key, row in rows.items():
+                vector = array("f")
+                vector.frombytes(view[row * row_size:(row + 1) * row_size])
+                vectors[key] = vector.tolist()
+        return [vectors.get(key) for key in keys]
+
+    def put_many(self, keys, vectors):
+        """ Append vectors, rows are allocated under a file lock """
+        with self._lock, open(self._vectors_path, "ab") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                if self.dim is None:
+                    self.dim = self._get_dim() or len(vectors[0])
+                    self._index.execute(
+                        "INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (self.dim,)
+                    )
+                row_size = self.dim * 4
+                size = os.fstat(file.fileno()).st_size
+                row = size // row_size
+                if size != row * row_size:
+                    # drop torn tail of an interrupted append, rows must stay aligned
+                    log.warning("Truncating %s bytes of partial row in %s", size - row * row_size, self._vectors_path)
+                    file.truncate(row * row_size)
+                max_rows = max(self.max_bytes // row_size, 1)
+                if row + len(keys) > max_rows:
+                    log.info("Embedding store %s reached %s rows, emptying it", self.path, row)
+                    self._index.execute("DELETE FROM vectors")
+                    file.truncate(0)
+                    row = 0
+                    keys, vectors = keys[:max_rows], vectors[:max_rows]
+                entries = []
+                for key, vector in zip(keys, vectors):
+                    if len(vector) != self.dim:
+                        continue
+                    file.write(array("f", vector).tobytes())
+                    entries.append((key, row))
+                    row += 1
+                file.flush()
+                self._index.executemany(
+                    "INSERT OR IGNORE INTO vectors (key, row) VALUES (?, ?)", entries
+                )
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    """ Embedding cache keyed by (scope, model, text hash), scope isolates tenants """
+
+    def __init__(self, path=EMBEDDING_CACHE_DIR, max_store_bytes=EMBEDDING_STORE_MAX_BYTES):
+        self.path = path
+        self.max_store_bytes = max_store_bytes
+        self.hits = 0
+        self.misses = 0
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def _store(self, scope, model_name) -> ModelVectorStore:
+        with self._lock:
+            if (scope, model_name) not in self._stores:
+                scope_dir = hashlib.sha256(repr(scope).encode("utf-8")).hexdigest()[:32]
+                safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", model_name)
+                self._stores[(scope, model_name)] = ModelVectorStore(
+                    os.path.join(self.path, scope_dir, safe_name), self.max_store_bytes,
+                )
+            return self._stores[(scope, model_name)]
+
+    def embed(self, scope, model_name, texts, embed_missing):
+        """ Vectors for texts; only unique cache misses are passed to embed_missing.
+        scope is a tuple of str (GCP project, credential fingerprint, ...), stores are not shared across scopes """
+        store = self._store(scope, model_name)
+        keys = [text_key(text) for text in texts]
+        vectors = store.get_many(keys)
+        missing = {}
+        for idx, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[idx], texts[idx])
+        misses = sum(vector is None for vector in vectors)
+        with self._lock:
+            self.hits += len(texts) - misses
+            self.misses += misses
+        if missing:
+            fresh = dict(zip(missing, embed_missing(list(missing.values()))))
+            try:
+                store.put_many(list(fresh), list(fresh.values()))
+            except:  # pylint: disable=W0702
+                log.exception("Failed to store embeddings for %s", model_name)
+            vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def info(self) -> dict:
+        """ Cache statistics """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "max_store_bytes": self.max_store_bytes,
+                "stores": len(self._stores),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_embedding_cache = EmbeddingCache()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """ Process-wide embedding cache """
+    return _embedding_cache
+
+
+def configure_embedding_cache(path=None, max_store_mb=None) -> EmbeddingCache:
+    """ Point embedding cache to another directory, max_store_mb bounds each model store """
+    global _embedding_cache  # pylint: disable=W0603
+    max_store_bytes = EMBEDDING_STORE_MAX_BYTES if max_store_mb is None else int(max_store_mb * 1024 * 1024)
+    _embedding_cache = EmbeddingCache(path or EMBEDDING_CACHE_DIR, max_store_bytes)
+    return _embedding_cache
@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Upstream error classification """
+
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpen(RuntimeError):
+    """ Circuit breaker of model/region is open, call was not sent """
+
+
+def is_retryable(error) -> bool:
+    """ True for throttling, timeout and transient server errors """
+    if isinstance(error, (ConnectionError, TimeoutError, CircuitOpen)):
+        return True
+    try:
+        from google.api_core import exceptions  # pylint: disable=C0415,E0401
+    except ImportError:
+        return False
+    if isinstance(error, (exceptions.RetryError, exceptions.DeadlineExceeded)):
+        return True
+    if isinstance(error, exceptions.GoogleAPICallError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def is_upstream_error(error) -> bool:
+    """ True if error is an answer from Vertex AI (API error status), not a local failure """
+    try:
+        from google.api_core import exceptions  # pylint: disable=C0415,E0401
+    except ImportError:
+        return False
+    return isinstance(error, exceptions.GoogleAPICallError)
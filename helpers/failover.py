@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Multi-region failover and hedged requests """
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .errors import is_retryable
+
+
+LATENCY_WINDOW = 200
+UNHEALTHY_FOR = 30
+HEDGE_MIN_SAMPLES = 20
+
+
+class ZoneHealth:
+    """ Per (GCP project, zone) latency window and failure cooldown """
+
+    def __init__(self, window=LATENCY_WINDOW, unhealthy_for=UNHEALTHY_FOR):
+        self.window = window
+        self.unhealthy_for = unhealthy_for
+        self._latencies = {}
+        self._unhealthy_until = {}
+        self._lock = threading.Lock()
+
+    def record_success(self, key, latency):
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=self.window)).append(latency)
+            self._unhealthy_until.pop(key, None)
+
+    def record_failure(self, key):
+        with self._lock:
+            self._unhealthy_until[key] = time.monotonic() + self.unhealthy_for
+
+    def is_healthy(self, key) -> bool:
+        return self._unhealthy_until.get(key, 0) <= time.monotonic()
+
+    def p95(self, key):
+        """ 95th percentile latency, None until enough samples """
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+    def info(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            keys = set(self._latencies) | set(self._unhealthy_until)
+            return {
+                "/".join(key): {
+                    "healthy": self._unhealthy_until.get(key, 0) <= now,
+                    "samples": len(self._latencies.get(key, ())),
+                }
+                for key in keys
+            }
+
+
+zone_health = ZoneHealth()
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="vertex_ai-hedge")
+
+
+def candidate_zones(project, zone, fallback_zones=None) -> list:
+    """ Primary zone and fallbacks, zones in failure cooldown moved to the end """
+    zones = list(dict.fromkeys([zone, *(fallback_zones or [])]))
+    healthy = [item for item in zones if zone_health.is_healthy((project, item))]
+    return healthy + [item for item in zones if item not in healthy]
+
+
+def pick_zone(project, zone, fallback_zones=None) -> str:
+    """ First zone that is not in failure cooldown """
+    return candidate_zones(project, zone, fallback_zones)[0]
+
+
+def _timed_call(project, zone, call):
+    started = time.perf_counter()
+    try:
+        result = call(zone)
+    except Exception as e:
+        if is_retryable(e):
+            zone_health.record_failure((project, zone))
+        raise
+    zone_health.record_success((project, zone), time.perf_counter() - started)
+    return result
+
+
+def call_with_failover(project, zones, call):
+    """ call(zone) on zones in order until one succeeds, only retryable errors fail over """
+    last_error = None
+    for zone in zones:
+        try:
+            return _timed_call(project, zone, call)
+        except Exception as e:  # pylint: disable=W0703
+            if not is_retryable(e):
+                raise
+            log.warning("Vertex AI call failed in %s, trying next zone: %s", zone, e)
+            last_error = e
+    raise last_error
+
+
+def _submit(project, zone, call):
+    """ _timed_call on the hedge pool, in a copy of the caller's context (metric labels) """
+    context = contextvars.copy_context()
+    return _hedge_executor.submit(context.run, _timed_call, project, zone, call)
+
+
+def call_hedged(project, zones, call, min_delay=0.5):
+    """
+        Send call(zones[0]), and call(zones[1]) if the first one is slower than p95
+
+        First successful result wins, the slower call is cancelled if it has not
+        started yet (in-flight requests can not be aborted and are discarded).
+        If the first call fails before the hedge delay, the rest of zones are
+        tried in order; so are zones[2:] when both hedged calls fail.
+    """
+    if len(zones) < 2:
+        return call_with_failover(project, zones, call)
+    primary, secondary = zones[:2]
+    delay = max(zone_health.p95((project, primary)) or 0, min_delay)
+    first = _submit(project, primary, call)
+    done, pending = wait({first}, timeout=delay)
+    if done:
+        error = first.exception()
+        if error is None:
+            return first.result()
+        if not is_retryable(error):
+            raise error
+        log.warning("Vertex AI call failed in %s, trying next zone: %s", primary, error)
+        return call_with_failover(project, zones[1:], call)
+    #
+    log.info("Hedging Vertex AI call to %s after %.3fs", secondary, delay)
+    pending.add(_submit(project, secondary, call))
+    last_error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            if not is_retryable(error):
+                for other in pending:
+                    other.cancel()
+                raise error
+            last_error = error
+    if len(zones) > 2:
+        return call_with_failover(project, zones[2:], call)
+    raise last_error
+
+
+async def acall_with_failover(project, zones, call):
+    """ Async call_with_failover, call(zone) returns awaitable """
+    last_error = None
+    for zone in zones:
+        started = time.perf_counter()
+        try:
+            result = await call(zone)
+        except Exception as e:  # pylint: disable=W0703
+            if not is_retryable(e):
+                raise
+            zone_health.record_failure((project, zone))
+            log.warning("Vertex AI call failed in %s, trying next zone: %s", zone, e)
+            last_error = e
+            continue
+        zone_health.record_success((project, zone), time.perf_counter() - started)
+        return result
+    raise last_error
@@ -0,0 +1,286 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Metrics in Prometheus text format """
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+current_operation = contextvars.ContextVar("vertex_ai_operation", default="unknown")
+OTHER_MODEL = "other"
+MAX_KNOWN_MODELS = 1024
+
+_known_models = set()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Counter:
+    """ Monotonic counter """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram(Counter):
+    """ Cumulative bucket histogram """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += bucket_count
+                    result.append((f"{self.name}_bucket", (*key, ("le", bound)), cumulative))
+                result.append((f"{self.name}_sum", key, total))
+                result.append((f"{self.name}_count", key, count))
+        return result
+
+
+class MetricsRegistry:
+    """ Metrics and gauge collectors rendered as Prometheus text """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """ Register func() returning [(name, documentation, {labels tuple: value})] gauges """
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        for func in self._collectors:
+            for name, documentation, values in func():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in values.items():
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.histogram(
+    "vertex_ai_request_duration_seconds", "RPC and callback latency",
+    ("operation", "model", "status"),
+)
+phase_duration = registry.histogram(
+    "vertex_ai_phase_duration_seconds", "Time spent per request phase",
+    ("operation", "phase"),
+)
+time_to_first_token = registry.histogram(
+    "vertex_ai_time_to_first_token_seconds", "Time to first streamed chunk",
+    ("operation", "model"),
+)
+inter_chunk_gap = registry.histogram(
+    "vertex_ai_inter_chunk_gap_seconds", "Time between streamed chunks",
+    ("operation", "model"),
+)
+tokens = registry.counter(
+    "vertex_ai_tokens_total", "Input/output tokens",
+    ("model", "direction"),
+)
+tokens_per_second = registry.histogram(
+    "vertex_ai_tokens_per_second", "Input/output tokens per second of upstream call",
+    ("model", "direction"), buckets=RATE_BUCKETS,
+)
+
+
+class _Timer:  # pylint: disable=R0903
+    elapsed = 0.0
+
+
+@contextmanager
+def phase(name):
+    """ Time block as phase of current operation """
+    timer = _Timer()
+    started = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        timer.elapsed = time.perf_counter() - started
+        phase_duration.observe(timer.elapsed, operation=current_operation.get(), phase=name)
+
+
+def register_models(model_ids):
+    """ Allow model ids (from IntegrationModel.models) as metric label values """
+    for model_id in model_ids:
+        if model_id not in _known_models and len(_known_models) < MAX_KNOWN_MODELS:
+            _known_models.add(model_id)
+
+
+def model_label(model) -> str:
+    """ Model label value: configured model id, OTHER_MODEL for anything client-supplied and unknown """
+    if not model:
+        return ""
+    return model if model in _known_models else OTHER_MODEL
+
+
+def record_usage(model, input_tokens, output_tokens, elapsed):
+    """ Token counters and tokens/s of upstream call """
+    model = model_label(model)
+    for direction, count in (("input", input_tokens), ("output", output_tokens)):
+        if not count:
+            continue
+        tokens.inc(count, model=model, direction=direction)
+        if elapsed > 0:
+            tokens_per_second.observe(count / elapsed, model=model, direction=direction)
+
+
+def _settings_model_ids(settings) -> list:
+    """ Model ids configured in integration settings of RPC/callback arguments """
+    if isinstance(settings, dict) and "integration_data" in settings:
+        settings = settings["integration_data"].get("settings", {})
+    models = settings.get("models") if isinstance(settings, dict) else None
+    return [
+        model if isinstance(model, str) else model.get("id")
+        for model in models or []
+        if isinstance(model, (str, dict))
+    ]
+
+
+def _model_label(arguments) -> str:
+    settings = arguments.get("settings")
+    settings = getattr(settings, "merged_settings", settings)
+    register_models(_settings_model_ids(settings))
+    request_data = arguments.get("request_data")
+    if isinstance(request_data, dict) and request_data.get("deployment_id"):
+        return model_label(request_data["deployment_id"])
+    if isinstance(settings, dict):
+        return model_label(settings.get("model_name") or arguments.get("model"))
+    return model_label(arguments.get("model"))
+
+
+def _observe_stream(chunks, operation, model, started):
+    """ Pass chunks through, request_duration is recorded when the stream ends """
+    status = "error"
+    try:
+        yield from chunks
+        status = "ok"
+    except GeneratorExit:
+        status = "cancelled"
+        raise
+    finally:
+        request_duration.observe(
+            time.perf_counter() - started, operation=operation, model=model, status=status,
+        )
+
+
+def instrument(operation):
+    """ Record latency of RPC/callback, status is taken from result["ok"] if present.
+    Streamed responses (generators) are timed until fully consumed """
+    def _decorator(func):
+        signature = inspect.signature(func)
+        #
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            try:
+                model = _model_label(signature.bind(*args, **kwargs).arguments)
+            except TypeError:
+                model = ""
+            token = current_operation.set(operation)
+            started = time.perf_counter()
+            status = "error"
+            try:
+                result = func(*args, **kwargs)
+                ok = result.get("ok", True) if isinstance(result, dict) else True
+                status = "ok" if ok else "error"
+                if ok and isinstance(result, dict) and inspect.isgenerator(result.get("response")):
+                    status = None
+                    return {
+                        **result,
+                        "response": _observe_stream(result["response"], operation, model, started),
+                    }
+                return result
+            finally:
+                if status is not None:
+                    request_duration.observe(
+                        time.perf_counter() - started, operation=operation, model=model, status=status,
+                    )
+                current_operation.reset(token)
+        #
+        return _wrapper
+    return _decorator
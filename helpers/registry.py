@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Model handle registry """
+
+import threading
+import time
+from concurrent.futures import Future
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .cache import TTLCache, MISSING
+
+
+MODEL_CACHE_SIZE = 256
+MODEL_REFRESH_AFTER = 15 * 60
+
+
+class ModelRegistry:
+    """ Resolved model handles, refreshed in background once stale """
+
+    def __init__(self, maxsize=MODEL_CACHE_SIZE, refresh_after=MODEL_REFRESH_AFTER):
+        self.refresh_after = refresh_after
+        self._handles = TTLCache(maxsize=maxsize)
+        self._refreshing = set()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """ Get handle for key, resolving it with loader() on miss """
+        entry = self._handles.get(key, MISSING)
+        if entry is MISSING:
+            return self._load(key, loader)
+        handle, loaded_at = entry
+        if time.monotonic() - loaded_at > self.refresh_after:
+            self._refresh_async(key, loader)
+        return handle
+
+    def _load(self, key, loader):
+        """ Resolve missing handle, concurrent misses of key wait for one loader() call """
+        with self._lock:
+            entry = self._handles.peek(key, MISSING)
+            if entry is not MISSING:
+                return entry[0]
+            future = self._loading.get(key)
+            leader = future is None
+            if leader:
+                future = self._loading[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            handle = loader()
+            self._handles.set(key, (handle, time.monotonic()))
+            future.set_result(handle)
+            return handle
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._loading[key]
+
+    def _refresh_async(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        #
+        def _refresh():
+            try:
+                self._handles.set(key, (loader(), time.monotonic()))
+            except:  # pylint: disable=W0702
+                log.exception("Failed to refresh model handle %s, keeping stale one", key[1:])
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        #
+        threading.Thread(target=_refresh, daemon=True).start()
+
+    def evict(self, predicate=None) -> int:
+        """ Drop handles whose key matches predicate (all if None) """
+        return self._handles.invalidate(predicate)
+
+    def info(self) -> dict:
+        """ Registry statistics """
+        return self._handles.info()
+
+
+model_registry = ModelRegistry()
+
+
+def model_key(session, kind, model_name, tuned_model_name='') -> tuple:
+    """ Registry key: (session key, model kind, model id, tuned model) """
+    return (session.key, kind, model_name, tuned_model_name)
+
+
+def evict_project_models(project_id=None) -> int:
+    """ Drop handles built with sessions of project (all if project_id is None),
+    they keep the credentials they were resolved with """
+    if project_id is None:
+        return model_registry.evict()
+    return model_registry.evict(lambda key: key[0][0] == project_id)
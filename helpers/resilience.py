@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Retries with jittered backoff, retry budget and circuit breakers """
+
+import asyncio
+import random
+import threading
+import time
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .errors import is_retryable, is_upstream_error, CircuitOpen
+from .metrics import registry
+
+
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 5.0
+BUDGET_RATIO = 0.1
+BUDGET_MAX_TOKENS = 10.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RECOVERY_TIMEOUT = 30.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+retries_total = registry.counter(
+    "vertex_ai_retries_total", "Upstream call retries", ("key",),
+)
+breaker_transitions = registry.counter(
+    "vertex_ai_circuit_transitions_total", "Circuit breaker state transitions", ("key", "state"),
+)
+
+
+class RetryBudget:
+    """ Each request deposits ratio tokens, each retry spends one, so retries stay below ratio of load """
+
+    def __init__(self, ratio=BUDGET_RATIO, max_tokens=BUDGET_MAX_TOKENS):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def info(self) -> dict:
+        return {"tokens": self.tokens, "max_tokens": self.max_tokens, "exhausted": self.exhausted}
+
+
+class CircuitBreaker:
+    """ Opens after consecutive failures, lets one probe through after recovery timeout """
+
+    def __init__(self, key, failure_threshold=BREAKER_FAILURE_THRESHOLD, recovery_timeout=BREAKER_RECOVERY_TIMEOUT):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        log.warning("Circuit breaker %s: %s -> %s", "/".join(self.key), self.state, state)
+        breaker_transitions.inc(key="/".join(self.key), state=state)
+        self.state = state
+        for listener in list(_listeners):
+            try:
+                listener(self.key, state)
+            except:  # pylint: disable=W0702
+                log.exception("Circuit breaker listener failed")
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    return False
+                self._transition(HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def release(self):
+        """ Call ended without an upstream verdict, let the next probe through """
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def info(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+retry_budget = RetryBudget()
+_breakers = {}
+_breakers_lock = threading.Lock()
+_listeners = []
+
+
+def add_breaker_listener(listener):
+    """ Call listener(key, state) on every breaker state transition """
+    _listeners.append(listener)
+
+
+def get_breaker(key) -> CircuitBreaker:
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(key)
+        return _breakers[key]
+
+
+def backoff_delay(attempt, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY) -> float:
+    """ Full jitter exponential backoff """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def _before_call(breaker, attempt, error=None):
+    if not breaker.allow():
+        if error is not None:
+            raise error  # breaker opened while backing off, surface the upstream error
+        raise CircuitOpen(f"Circuit breaker for {'/'.join(breaker.key)} is open")
+    if attempt == 0:
+        retry_budget.record_request()
+
+
+def _after_error(breaker, error, attempt, retries) -> bool:
+    """ Record error, True if call should be retried """
+    if not is_retryable(error) or isinstance(error, CircuitOpen):
+        if is_upstream_error(error):
+            breaker.record_success()  # upstream answered, request itself is bad
+        else:
+            breaker.release()  # local failure (admission, validation), says nothing about upstream
+        return False
+    breaker.record_failure()
+    if breaker.state == OPEN or attempt >= retries or not retry_budget.try_spend():
+        return False
+    retries_total.inc(key="/".join(breaker.key))
+    log.warning("Retrying %s after error (attempt %s): %s", "/".join(breaker.key), attempt + 1, error)
+    return True
+
+
+def call_with_retries(key, call, retries=2, base_delay=RETRY_BASE_DELAY):
+    """ call() guarded by circuit breaker of key, retryable errors retried with backoff """
+    breaker = get_breaker(key)
+    attempt, error = 0, None
+    while True:
+        _before_call(breaker, attempt, error)
+        try:
+            result = call()
+        except Exception as e:  # pylint: disable=W0703
+            if not _after_error(breaker, e, attempt, retries):
+                raise
+            error = e
+            time.sleep(backoff_delay(attempt, base_delay))
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+async def acall_with_retries(key, call, retries=2, base_delay=RETRY_BASE_DELAY):
+    """ Async call_with_retries, call() returns awaitable """
+    breaker = get_breaker(key)
+    attempt, error = 0, None
+    while True:
+        _before_call(breaker, attempt, error)
+        try:
+            result = await call()
+        except Exception as e:  # pylint: disable=W0703
+            if not _after_error(breaker, e, attempt, retries):
+                raise
+            error = e
+            await asyncio.sleep(backoff_delay(attempt, base_delay))
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+def resilience_info() -> dict:
+    with _breakers_lock:
+        breakers = {"/".join(key): breaker.info() for key, breaker in _breakers.items()}
+    return {"retry_budget": retry_budget.info(), "breakers": breakers}
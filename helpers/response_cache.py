@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Response cache for deterministic completions """
+
+import abc
+import dataclasses
+import hashlib
+import json
+from collections import deque
+
+from .cache import TTLCache
+
+
+RESPONSE_CACHE_SIZE = 4096
+
+
+class ResponseCacheBackend(abc.ABC):
+    """ Response cache backend interface """
+
+    @abc.abstractmethod
+    def get(self, key):
+        """ Cached value or None """
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl):
+        """ Store value for ttl seconds """
+
+    def info(self) -> dict:
+        """ Backend statistics """
+        return {}
+
+
+class MemoryResponseCache(ResponseCacheBackend):
+    """ In-process LRU backend """
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE):
+        self._cache = TTLCache(maxsize=maxsize)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl=ttl)
+
+    def info(self) -> dict:
+        return self._cache.info()
+
+
+_backend = MemoryResponseCache()
+
+
+def get_response_cache() -> ResponseCacheBackend:
+    """ Current response cache backend """
+    return _backend
+
+
+def set_response_cache(backend: ResponseCacheBackend) -> None:
+    """ Replace response cache backend, e.g. with a shared store """
+    global _backend  # pylint: disable=W0603
+    _backend = backend
+
+
+def _canonical(value):
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    if isinstance(value, (deque, tuple, set)):
+        return list(value)
+    return str(value)
+
+
+def request_fingerprint(*parts) -> str:
+    """ Canonical hash of request parts """
+    payload = json.dumps(parts, sort_keys=True, default=_canonical, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Workload-aware routing keys for worker tasks """
+
+import threading
+from collections import Counter
+
+
+INTERACTIVE_STREAM = "interactive_stream"
+INTERACTIVE_INVOKE = "interactive_invoke"
+BULK_EMBED = "bulk_embed"
+UTILITY = "utility"
+
+LANES = (INTERACTIVE_STREAM, INTERACTIVE_INVOKE, BULK_EMBED, UTILITY)
+
+
+class _Lane:
+    """ Smooth weighted round-robin over lane routing keys """
+
+    def __init__(self, routing_keys):
+        self.weights = {key: int(weight) for key, weight in routing_keys.items() if int(weight) > 0}
+        self.current = dict.fromkeys(self.weights, 0)
+
+    def next_key(self):
+        total = sum(self.weights.values())
+        for key, weight in self.weights.items():
+            self.current[key] += weight
+        key = max(self.current, key=self.current.get)
+        self.current[key] -= total
+        return key
+
+
+class Router:
+    """
+        Assigns worker routing keys by workload class
+
+        Config example (module config "routing" section):
+            lanes:
+              interactive_stream:
+                routing_keys: {"vertex_ai_interactive": 3, "vertex_ai_shared": 1}
+              bulk_embed:
+                routing_keys: {"vertex_ai_bulk_{location}": 1}
+
+        Routing keys may use {lane}, {model} and {location} placeholders.
+        Lanes that are not configured keep routing_key None (default queue).
+    """
+
+    def __init__(self):
+        self._lanes = {}
+        self._dispatched = Counter()
+        self._lock = threading.Lock()
+
+    def configure(self, config=None):
+        """ Load lanes from config """
+        lanes = {}
+        for lane, lane_config in ((config or {}).get("lanes") or {}).items():
+            routing_keys = lane_config.get("routing_keys") or {}
+            if isinstance(routing_keys, (list, tuple)):
+                routing_keys = dict.fromkeys(routing_keys, 1)
+            if routing_keys:
+                lanes[lane] = _Lane(routing_keys)
+        with self._lock:
+            self._lanes = lanes
+
+    def route(self, lane, model=None, location=None):
+        """ Routing key for task of lane """
+        with self._lock:
+            lane_state = self._lanes.get(lane)
+            if lane_state is None or not lane_state.weights:
+                self._dispatched[(lane, None)] += 1
+                return None
+            routing_key = lane_state.next_key().format(
+                lane=lane, model=model or "", location=location or "",
+            )
+            self._dispatched[(lane, routing_key)] += 1
+            return routing_key
+
+    def info(self) -> dict:
+        """ Tasks dispatched per lane and routing key since start """
+        with self._lock:
+            result = {lane: {"total": 0, "routing_keys": {}} for lane in LANES}
+            for (lane, routing_key), count in self._dispatched.items():
+                lane_info = result.setdefault(lane, {"total": 0, "routing_keys": {}})
+                lane_info["total"] += count
+                lane_info["routing_keys"][str(routing_key)] = count
+            return result
+
+
+router = Router()
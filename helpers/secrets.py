@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Short-lived cache of unsecreted values """
+
+import hashlib
+import json
+
+from tools import worker_client  # pylint: disable=E0401
+
+from .cache import TTLCache
+
+
+SECRET_CACHE_SIZE = 256
+SECRET_CACHE_TTL = 60
+
+_secrets = TTLCache(maxsize=SECRET_CACHE_SIZE, ttl=SECRET_CACHE_TTL)
+
+
+def raw_value(value):
+    """ JSON-serializable raw value, bypassing secret masking """
+    if hasattr(value, 'get_secret_value'):
+        return value.get_secret_value()
+    if isinstance(value, str):
+        return str.__str__(value)
+    if hasattr(value, '__dict__'):
+        return vars(value)
+    return str(value)
+
+
+def secret_fingerprint(value) -> str:
+    """ Stable fingerprint of a (possibly secret-referencing) value """
+    value = json.dumps(value, sort_keys=True, default=raw_value)
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def unsecret_cached(value, project_id):
+    """ worker_client.unsecret_data() memoized by (project_id, secret reference) """
+    key = (project_id, secret_fingerprint(value))
+    return _secrets.get_or_create(key, lambda: worker_client.unsecret_data(value, project_id))
+
+
+def invalidate_secrets(project_id=None) -> int:
+    """ Drop unsecreted values of project (all if project_id is None) """
+    if project_id is None:
+        return _secrets.invalidate()
+    return _secrets.invalidate(lambda key: key[0] == project_id)
+
+
+def secret_cache_info() -> dict:
+    """ Secret cache statistics """
+    return _secrets.info()
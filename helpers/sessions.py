@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Vertex AI sessions """
+
+import json
+import threading
+from contextlib import contextmanager
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .cache import TTLCache
+from .secrets import secret_fingerprint, unsecret_cached
+
+
+SESSION_CACHE_SIZE = 64
+SESSION_CACHE_TTL = 30 * 60
+
+
+class VertexSession:
+    """ Initialized credentials for one project/location """
+
+    def __init__(self, key, project, location, credentials):
+        self.key = key
+        self.project = project
+        self.location = location
+        self.credentials = credentials
+        self._lock = threading.Lock()
+
+    def ensure_token(self):
+        """ Refresh OAuth access token if it is missing or expired """
+        from google.auth.transport.requests import Request  # pylint: disable=C0415,E0401
+        #
+        with self._lock:
+            if not self.credentials.valid:
+                self.credentials.refresh(Request())
+        return self.credentials
+
+    @contextmanager
+    def activated(self):
+        """ Keep this session the vertexai global config for the duration of the block,
+        for work that reads the global config (model handle resolution). Blocks of the
+        same session run concurrently, other sessions wait for them to finish; the lock
+        itself is held only while the config is swapped """
+        global _active_session, _active_users  # pylint: disable=W0603
+        import vertexai  # pylint: disable=C0415,E0401
+        #
+        with _config_released:
+            while _active_users and _active_session is not self:
+                _config_released.wait()
+            if _active_session is not self:
+                vertexai.init(
+                    project=self.project,
+                    location=self.location,
+                    credentials=self.credentials,
+                )
+                _active_session = self
+            _active_users += 1
+        try:
+            yield self
+        finally:
+            with _config_released:
+                _active_users -= 1
+                if not _active_users:
+                    _config_released.notify_all()
+
+
+_sessions = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+_config_released = threading.Condition()
+_active_session = None
+_active_users = 0
+
+
+def session_key(project_id, settings, location, service_account_info) -> tuple:
+    """ Cache key: (project_id, GCP project, zone, fingerprint of unsecreted service account) """
+    return (
+        project_id,
+        settings.project,
+        location,
+        secret_fingerprint(service_account_info),
+    )
+
+
+def _create_session(key, settings, location, service_account_info):
+    from google.oauth2.service_account import Credentials  # pylint: disable=C0415,E0401
+    #
+    if isinstance(service_account_info, str):
+        service_account_info = json.loads(service_account_info)
+    credentials = Credentials.from_service_account_info(
+        service_account_info,
+        scopes=['https://www.googleapis.com/auth/cloud-platform'],
+    )
+    log.info('Created Vertex AI session for project %s, location %s', settings.project, location)
+    return VertexSession(key, settings.project, location, credentials)
+
+
+def get_session(project_id, settings, location=None) -> VertexSession:
+    """ Get cached session for integration settings, creating it on miss """
+    location = location or settings.zone
+    # keyed by the secret value, so a secret rotated under the same name gets a new session
+    service_account_info = unsecret_cached(settings.service_account_info, project_id)
+    key = session_key(project_id, settings, location, service_account_info)
+    return _sessions.get_or_create(
+        key, lambda: _create_session(key, settings, location, service_account_info)
+    )
+
+
+def invalidate_sessions(project_id=None) -> int:
+    """ Drop cached sessions of project (all if project_id is None) """
+    if project_id is None:
+        return _sessions.invalidate()
+    return _sessions.invalidate(lambda key: key[0] == project_id)
+
+
+def session_cache_info() -> dict:
+    """ Session cache statistics """
+    return _sessions.info()
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Stream chunk coalescing """
+
+import queue
+import threading
+import time
+
+
+_END = object()
+
+
+class _Error:  # pylint: disable=R0903
+    def __init__(self, error):
+        self.error = error
+
+
+def _read(chunks, items, stopped):
+    try:
+        for chunk in chunks:
+            if stopped.is_set():
+                # consumer went away, release the upstream stream now rather than on GC
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+                return
+            items.put(chunk)
+    except BaseException as e:  # pylint: disable=W0703
+        items.put(_Error(e))
+    items.put(_END)
+
+
+def coalesce(chunks, min_bytes=0, max_hold=0.05):
+    """
+        Merge consecutive text chunks into chunks of at least min_bytes
+
+        First chunk is passed through immediately, later ones are held for at
+        most max_hold seconds. min_bytes <= 0 disables coalescing.
+    """
+    if min_bytes <= 0:
+        yield from chunks
+        return
+    #
+    items = queue.Queue()
+    stopped = threading.Event()
+    threading.Thread(target=_read, args=(chunks, items, stopped), daemon=True).start()
+    #
+    try:
+        item = items.get()
+        if item is _END:
+            return
+        if isinstance(item, _Error):
+            raise item.error
+        yield item
+        #
+        buffer, size, deadline = [], 0, None
+        while True:
+            try:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                item = items.get(timeout=timeout)
+            except queue.Empty:
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+                continue
+            if item is _END or isinstance(item, _Error):
+                break
+            buffer.append(item)
+            size += len(item.encode("utf-8"))
+            if deadline is None:
+                deadline = time.monotonic() + max_hold
+            if size >= min_bytes:
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+        if buffer:
+            yield "".join(buffer)
+        if isinstance(item, _Error):
+            raise item.error
+    finally:
+        stopped.set()
+
@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Per-model token count estimator calibrated against real Vertex AI counts """
+
+import math
+import threading
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .tokenizer import count_tokens_batch
+
+
+TOKENS_PER_MESSAGE = 4
+PRIOR_RATIO = 1.0
+PRIOR_STDDEV = 0.3
+PRIOR_WEIGHT = 5
+Z_SCORE = 3.0
+MAX_SAMPLES = 1000
+
+
+def text_segments(data) -> list:
+    """ Strings to count in a prompt: plain text or list of messages/content parts """
+    if isinstance(data, str):
+        return [data]
+    segments = []
+    for item in data or []:
+        if isinstance(item, str):
+            segments.append(item)
+        elif isinstance(item, dict):
+            for value in item.values():
+                if isinstance(value, str):
+                    segments.append(value)
+                elif isinstance(value, list):
+                    segments.extend(text_segments(value))
+    return segments
+
+
+def base_token_count(data) -> int:
+    """ cl100k count of data, plus per-message overhead for message lists """
+    count = sum(count_tokens_batch(text_segments(data)))
+    if isinstance(data, list):
+        count += TOKENS_PER_MESSAGE * len(data)
+    return count
+
+
+class RatioStats:
+    """ Running mean/variance of real/cl100k token ratio, blended with a prior until calibrated """
+
+    def __init__(self):
+        self.samples = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    def add(self, ratio):
+        # incremental mean/variance, exponentially weighted once MAX_SAMPLES is reached
+        if self.samples < MAX_SAMPLES:
+            self.samples += 1
+        alpha = 1.0 / self.samples
+        delta = ratio - self.mean
+        self.mean += alpha * delta
+        self.variance = (1 - alpha) * (self.variance + alpha * delta * delta)
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def blended(self) -> tuple:
+        """ (ratio, stddev) weighted between prior and observations """
+        weight = self.samples / (self.samples + PRIOR_WEIGHT)
+        ratio = weight * self.mean + (1 - weight) * PRIOR_RATIO
+        stddev = weight * self.stddev + (1 - weight) * PRIOR_STDDEV
+        return ratio, stddev
+
+
+class TokenEstimator:
+    """ Local estimate of real token count with an error bound per model """
+
+    def __init__(self):
+        self.local = 0
+        self.remote = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def estimate(self, model_name, base_count) -> tuple:
+        """ (estimate, error bound) for a cl100k count """
+        with self._lock:
+            stats = self._stats.get(model_name)
+            ratio, stddev = stats.blended() if stats else (PRIOR_RATIO, PRIOR_STDDEV)
+        return int(math.ceil(ratio * base_count)), int(math.ceil(Z_SCORE * stddev * base_count))
+
+    def calibrate(self, model_name, base_count, real_count):
+        """ Record real count reported by Vertex AI for text with base_count cl100k tokens """
+        if base_count <= 0 or real_count <= 0:
+            return
+        with self._lock:
+            stats = self._stats.setdefault(model_name, RatioStats())
+            stats.add(real_count / base_count)
+
+    def count(self, model_name, data, limit, count_remote) -> dict:
+        """ Local estimate, or count_remote(data) when limit is within the error bound """
+        base_count = base_token_count(data)
+        estimate, bound = self.estimate(model_name, base_count)
+        if limit and estimate - bound <= limit <= estimate + bound:
+            try:
+                real_count = int(count_remote(data))
+            except Exception as e:  # pylint: disable=W0703
+                log.warning("Remote token count for %s failed, using estimate: %s", model_name, e)
+            else:
+                self.calibrate(model_name, base_count, real_count)
+                with self._lock:
+                    self.remote += 1
+                return {"count": real_count, "estimated": False, "error_bound": 0}
+        with self._lock:
+            self.local += 1
+        return {"count": estimate, "estimated": True, "error_bound": bound}
+
+    def info(self) -> dict:
+        with self._lock:
+            models = {
+                name: {"samples": stats.samples, "ratio": stats.mean, "stddev": stats.stddev}
+                for name, stats in self._stats.items()
+            }
+            return {"local": self.local, "remote": self.remote, "models": models}
+
+
+token_estimator = TokenEstimator()
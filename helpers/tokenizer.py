@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Tokenizer """
+
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .cache import TTLCache, MISSING
+from .tokenizer_data import load_offline_encoding, write_rank_file
+
+
+ENCODING_NAME = 'cl100k_base'
+TOKEN_CACHE_SIZE = 8192
+PARALLEL_ENCODE_MIN = 32
+ENCODE_THREADS = 8
+DEFAULT_DATA_DIR = os.environ.get('TIKTOKEN_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'vertex_ai_tokenizer')
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_data_dir = DEFAULT_DATA_DIR
+_token_counts = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+_encode_executor = None
+
+
+def configure_tokenizer(data_dir=None):
+    """ Writable directory with <encoding>.ranks / <encoding>.tiktoken files,
+    default is TIKTOKEN_CACHE_DIR or <tempdir>/vertex_ai_tokenizer """
+    global _data_dir, _encoding  # pylint: disable=W0603
+    with _encoding_lock:
+        _data_dir = data_dir or DEFAULT_DATA_DIR
+        _encoding = None
+
+
+def _load_encoding():
+    try:
+        encoding = load_offline_encoding(ENCODING_NAME, _data_dir)
+    except:  # pylint: disable=W0702
+        log.exception("Failed to load %s from %s", ENCODING_NAME, _data_dir)
+        encoding = None
+    if encoding is not None:
+        return encoding
+    import tiktoken  # pylint: disable=C0415,E0401
+    encoding = tiktoken.get_encoding(ENCODING_NAME)
+    # keep the downloaded ranks so the next process (or an air-gapped copy of data dir) loads offline
+    try:
+        write_rank_file(encoding._mergeable_ranks, os.path.join(_data_dir, f'{ENCODING_NAME}.ranks'))  # pylint: disable=W0212
+    except:  # pylint: disable=W0702
+        log.warning("Could not store %s ranks in %s", ENCODING_NAME, _data_dir)
+    return encoding
+
+
+def get_encoding():
+    """ Process-wide encoder, loaded on first use from local rank data when available """
+    global _encoding  # pylint: disable=W0603
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                _encoding = _load_encoding()
+    return _encoding
+
+
+def _encode_all(texts: list) -> list:
+    """ Encode texts, small batches inline, large ones on a persistent pool (encode releases the GIL) """
+    global _encode_executor  # pylint: disable=W0603
+    encoding = get_encoding()
+    if len(texts) < PARALLEL_ENCODE_MIN:
+        return [encoding.encode(text) for text in texts]
+    if _encode_executor is None:
+        with _encoding_lock:
+            if _encode_executor is None:
+                _encode_executor = ThreadPoolExecutor(
+                    max_workers=ENCODE_THREADS, thread_name_prefix="vertex_ai-tokenizer",
+                )
+    return list(_encode_executor.map(encoding.encode, texts))
+
+
+def content_key(text: str) -> bytes:
+    """ Content hash used as token count cache key """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def count_tokens(text: str) -> int:
+    """ Number of tokens in text, memoized by content hash """
+    key = content_key(text)
+    count = _token_counts.get(key, MISSING)
+    if count is MISSING:
+        count = len(get_encoding().encode(text))
+        _token_counts.set(key, count)
+    return count
+
+
+def count_tokens_batch(texts: list) -> list:
+    """ Token counts of texts, encoding all cache misses in one batch """
+    counts = [0] * len(texts)
+    pending = {}
+    for idx, text in enumerate(texts):
+        key = content_key(text)
+        count = _token_counts.get(key, MISSING)
+        if count is MISSING:
+            pending.setdefault(key, (text, []))[1].append(idx)
+        else:
+            counts[idx] = count
+    if pending:
+        items = list(pending.items())
+        encoded = _encode_all([text for _, (text, _) in items])
+        for (key, (_, indexes)), tokens in zip(items, encoded):
+            _token_counts.set(key, len(tokens))
+            for idx in indexes:
+                counts[idx] = len(tokens)
+    return counts
+
+
+def token_cache_info() -> dict:
+    """ Token count cache statistics """
+    return _token_counts.info()
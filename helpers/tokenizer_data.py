@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    Precompiled BPE rank files for offline tokenizer loading
+
+    A .ranks file holds the mergeable ranks of a tiktoken encoding in a
+    flat little-endian layout that is read through mmap without base64
+    decoding or network access:
+
+        header   magic (8 bytes), version (u32), count (u32)
+        ranks    count x u32
+        offsets  (count + 1) x u32, token i is blob[offsets[i]:offsets[i + 1]]
+        blob     concatenated token bytes
+
+    File pages are shared by all processes through the page cache. The
+    rank dict and tiktoken's native tables are still built per process,
+    tiktoken has no way to use external memory for them.
+
+    python helpers/tokenizer_data.py cl100k_base.tiktoken cl100k_base.ranks
+"""
+
+import base64
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+
+MAGIC = b"VXBPERNK"
+VERSION = 1
+HEADER = struct.Struct("<8sII")
+
+CL100K_PAT_STR = (
+    r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}|"""
+    r""" ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+CL100K_SPECIAL_TOKENS = {
+    "<|endoftext|>": 100257,
+    "<|fim_prefix|>": 100258,
+    "<|fim_middle|>": 100259,
+    "<|fim_suffix|>": 100260,
+    "<|endofprompt|>": 100276,
+}
+ENCODINGS = {
+    "cl100k_base": (CL100K_PAT_STR, CL100K_SPECIAL_TOKENS),
+}
+
+
+def _u32_array(data) -> array:
+    values = array("I")
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def read_tiktoken_file(path) -> dict:
+    """ Parse tiktoken "<base64 token> <rank>" text file """
+    ranks = {}
+    with open(path, "rb") as file:
+        for line in file:
+            if line.strip():
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+def write_rank_file(ranks: dict, path):
+    """ Write ranks to path atomically """
+    items = sorted(ranks.items(), key=lambda item: item[1])
+    rank_values = array("I", (rank for _, rank in items))
+    offsets = array("I", [0])
+    for token, _ in items:
+        offsets.append(offsets[-1] + len(token))
+    if sys.byteorder != "little":
+        rank_values.byteswap()
+        offsets.byteswap()
+    #
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(items)))
+            file.write(rank_values.tobytes())
+            file.write(offsets.tobytes())
+            for token, _ in items:
+                file.write(token)
+        os.replace(tmp_path, path)
+    except:  # pylint: disable=W0702
+        os.unlink(tmp_path)
+        raise
+
+
+def read_rank_file(path) -> dict:
+    """ token bytes -> rank from a .ranks file """
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, count = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} rank file")
+            start = HEADER.size
+            ranks = _u32_array(data[start:start + 4 * count])
+            start += 4 * count
+            offsets = _u32_array(data[start:start + 4 * (count + 1)])
+            blob = start + 4 * (count + 1)
+            return {
+                data[blob + offsets[idx]:blob + offsets[idx + 1]]: ranks[idx]
+                for idx in range(count)
+            }
+
+
+def load_offline_encoding(name, data_dir):
+    """ tiktoken.Encoding from data_dir/<name>.ranks, compiled from data_dir/<name>.tiktoken
+    if only that is present; None if there is no data for name """
+    if name not in ENCODINGS or not data_dir:
+        return None
+    import tiktoken  # pylint: disable=C0415,E0401
+    #
+    rank_path = os.path.join(data_dir, f"{name}.ranks")
+    source_path = os.path.join(data_dir, f"{name}.tiktoken")
+    if not os.path.exists(rank_path):
+        if not os.path.exists(source_path):
+            return None
+        write_rank_file(read_tiktoken_file(source_path), rank_path)
+    #
+    pat_str, special_tokens = ENCODINGS[name]
+    return tiktoken.Encoding(
+        name=name,
+        pat_str=pat_str,
+        mergeable_ranks=read_rank_file(rank_path),
+        special_tokens=special_tokens,
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(f"usage: {sys.argv[0]} <source.tiktoken> <target.ranks>")
+    write_rank_file(read_tiktoken_file(sys.argv[1]), sys.argv[2])
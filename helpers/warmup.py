@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Background warm-up of process-wide state (SDK import, tokenizer) """
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_DEADLINE = 120.0
+
+
+class WarmUp:
+    """ Runs named warm-up targets in a daemon thread with bounded concurrency and a deadline """
+
+    def __init__(self):
+        self._status = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.started_at = None
+        self.finished_at = None
+
+    def _set(self, key, status, error=None):
+        with self._lock:
+            self._status[key] = {"status": status, "error": error}
+
+    def start(self, get_targets, warm, concurrency=DEFAULT_CONCURRENCY, deadline=DEFAULT_DEADLINE):
+        """ get_targets() -> {key: target}, warm(target) runs once per target; returns at once """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=self._run, args=(get_targets, warm, concurrency, deadline),
+            name="vertex_ai-warm-up", daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self, get_targets, warm, concurrency, deadline):
+        self.started_at = time.time()
+        deadline_at = time.monotonic() + deadline
+        try:
+            targets = get_targets()
+        except:  # pylint: disable=W0702
+            log.exception("Warm-up: failed to collect targets")
+            self.finished_at = time.time()
+            return
+        #
+        for key in targets:
+            self._set(key, PENDING)
+        #
+        def _warm(key, target):
+            if time.monotonic() >= deadline_at:
+                self._set(key, TIMED_OUT)
+                return
+            self._set(key, WARMING)
+            try:
+                warm(target)
+            except Exception as e:  # pylint: disable=W0703
+                log.warning("Warm-up of %s failed: %s", key, e)
+                self._set(key, FAILED, f"{type(e).__name__}: {e}")
+                return
+            self._set(key, READY)
+        #
+        pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="vertex_ai-warm-up")
+        futures = [pool.submit(_warm, key, target) for key, target in targets.items()]
+        wait(futures, timeout=max(0.0, deadline_at - time.monotonic()))
+        pool.shutdown(wait=False, cancel_futures=True)
+        #
+        with self._lock:
+            for item in self._status.values():
+                if item["status"] in (PENDING, WARMING):
+                    item["status"] = TIMED_OUT
+        self.finished_at = time.time()
+        log.info("Warm-up finished: %s", self.info()["summary"])
+
+    def status(self, key) -> str:
+        with self._lock:
+            item = self._status.get(key)
+        return item["status"] if item else PENDING
+
+    def info(self) -> dict:
+        with self._lock:
+            targets = {key: dict(item) for key, item in self._status.items()}
+        summary = {}
+        for item in targets.values():
+            summary[item["status"]] = summary.get(item["status"], 0) + 1
+        return {
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "summary": summary,
+            "targets": targets,
+        }
+
+
+startup_warm_up = WarmUp()
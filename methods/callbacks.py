@@ -22,7 +22,15 @@ import json
 from pylon.core.tools import log  # pylint: disable=E0611,E0401,W0611
 from pylon.core.tools import web  # pylint: disable=E0611,E0401,W0611
 
-from tools import worker_client  # pylint: disable=E0401
+from ..helpers.secrets import unsecret_cached
+from ..helpers import routing
+from ..helpers.failover import pick_zone
+from ..helpers import metrics
+
+
+def _location(settings):
+    """ Integration zone, or first fallback zone if it is in failure cooldown """
+    return pick_zone(settings["project"], settings["zone"], settings.get("fallback_zones"))
 
 
 class Method:  # pylint: disable=E1101,R0903,W0201
@@ -40,6 +48,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
     #
 
     @web.method()
+    @metrics.instrument('callback:ai_check_settings')
     def ai_check_settings(  # pylint: disable=R0913
             self, settings,
         ):
@@ -47,7 +56,10 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         settings = json.loads(json.dumps(settings))
         #
         result = {
-            "routing_key": None,
+            "routing_key": routing.router.route(
+                routing.UTILITY,
+                location=settings["zone"],
+            ),
             #
             "target": "plugins.vertex_ai_worker.utils.ai.Helper",
             "target_args": None,
@@ -66,6 +78,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         return result
 
     @web.method()
+    @metrics.instrument('callback:ai_get_models')
     def ai_get_models(  # pylint: disable=R0913
             self, settings,
         ):
@@ -73,7 +86,10 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         settings = json.loads(json.dumps(settings))
         #
         result = {
-            "routing_key": None,
+            "routing_key": routing.router.route(
+                routing.UTILITY,
+                location=settings["zone"],
+            ),
             #
             "target": "plugins.vertex_ai_worker.utils.ai.Helper",
             "target_args": None,
@@ -92,6 +108,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         return result
 
     @web.method()
+    @metrics.instrument('callback:count_tokens')
     def count_tokens(  # pylint: disable=R0913
             self, settings, data,
         ):
@@ -102,7 +119,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         except AttributeError:
             project_id = None
         #
-        service_account_info = worker_client.unsecret_data(
+        service_account_info = unsecret_cached(
             settings.merged_settings["service_account_info"], project_id
         )
         #
@@ -126,13 +143,17 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             target_class = "langchain_google_vertexai.llms.VertexAI"
         #
         result = {
-            "routing_key": None,
+            "routing_key": routing.router.route(
+                routing.UTILITY,
+                model=settings.merged_settings["model_name"],
+                location=_location(settings.merged_settings),
+            ),
             #
             "target": "plugins.vertex_ai_worker.utils.ai.Helper",
             "target_args": None,
             "target_kwargs": {
                 "project": settings.merged_settings["project"],
-                "location": settings.merged_settings["zone"],
+                "location": _location(settings.merged_settings),
                 "service_account_info": service_account_info,
                 "target_class": target_class,
                 "target_args": None,
@@ -158,6 +179,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
     #
 
     @web.method()
+    @metrics.instrument('callback:llm_invoke')
     def llm_invoke(  # pylint: disable=R0913
             self, settings, text,
         ):
@@ -168,7 +190,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         except AttributeError:
             project_id = None
         #
-        service_account_info = worker_client.unsecret_data(
+        service_account_info = unsecret_cached(
             settings.merged_settings["service_account_info"], project_id
         )
         #
@@ -179,13 +201,17 @@ class Method:  # pylint: disable=E1101,R0903,W0201
                 model_parameters[param] = settings.merged_settings[param]
         #
         result = {
-            "routing_key": None,
+            "routing_key": routing.router.route(
+                routing.INTERACTIVE_INVOKE,
+                model=settings.merged_settings["model_name"],
+                location=_location(settings.merged_settings),
+            ),
             #
             "target": "plugins.vertex_ai_worker.utils.ai.Helper",
             "target_args": None,
             "target_kwargs": {
                 "project": settings.merged_settings["project"],
-                "location": settings.merged_settings["zone"],
+                "location": _location(settings.merged_settings),
                 "service_account_info": service_account_info,
                 "target_class": "langchain_google_vertexai.llms.VertexAI",
                 "target_args": None,
@@ -207,6 +233,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         return result
 
     @web.method()
+    @metrics.instrument('callback:llm_stream')
     def llm_stream(  # pylint: disable=R0913
             self, settings, text, stream_id,
         ):
@@ -217,7 +244,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         except AttributeError:
             project_id = None
         #
-        service_account_info = worker_client.unsecret_data(
+        service_account_info = unsecret_cached(
             settings.merged_settings["service_account_info"], project_id
         )
         #
@@ -228,13 +255,17 @@ class Method:  # pylint: disable=E1101,R0903,W0201
                 model_parameters[param] = settings.merged_settings[param]
         #
         result = {
-            "routing_key": None,
+            "routing_key": routing.router.route(
+                routing.INTERACTIVE_STREAM,
+                model=settings.merged_settings["model_name"],
+                location=_location(settings.merged_settings),
+            ),
             #
             "target": "plugins.vertex_ai_worker.utils.ai.Helper",
             "target_args": None,
             "target_kwargs": {
                 "project": settings.merged_settings["project"],
-                "location": settings.merged_settings["zone"],
+                "location": _location(settings.merged_settings),
                 "service_account_info": service_account_info,
                 "target_class": "langchain_google_vertexai.llms.VertexAI",
                 "target_args": None,
@@ -263,6 +294,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
     #
 
     @web.method()
+    @metrics.instrument('callback:chat_model_invoke')
     def chat_model_invoke(  # pylint: disable=R0913
             self, settings, messages,
         ):
@@ -273,7 +305,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         except AttributeError:
             project_id = None
         #
-        service_account_info = worker_client.unsecret_data(
+        service_account_info = unsecret_cached(
             settings.merged_settings["service_account_info"], project_id
         )
         #
@@ -284,13 +316,17 @@ class Method:  # pylint: disable=E1101,R0903,W0201
                 model_parameters[param] = settings.merged_settings[param]
         #
         result = {
-            "routing_key": None,
+            "routing_key": routing.router.route(
+                routing.INTERACTIVE_INVOKE,
+                model=settings.merged_settings["model_name"],
+                location=_location(settings.merged_settings),
+            ),
             #
             "target": "plugins.vertex_ai_worker.utils.ai.Helper",
             "target_args": None,
             "target_kwargs": {
                 "project": settings.merged_settings["project"],
-                "location": settings.merged_settings["zone"],
+                "location": _location(settings.merged_settings),
                 "service_account_info": service_account_info,
                 "target_class": "langchain_google_vertexai.chat_models.ChatVertexAI",
                 "target_args": None,
@@ -312,6 +348,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         return result
 
     @web.method()
+    @metrics.instrument('callback:chat_model_stream')
     def chat_model_stream(  # pylint: disable=R0913
             self, settings, messages, stream_id,
         ):
@@ -322,7 +359,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         except AttributeError:
             project_id = None
         #
-        service_account_info = worker_client.unsecret_data(
+        service_account_info = unsecret_cached(
             settings.merged_settings["service_account_info"], project_id
         )
         #
@@ -333,13 +370,17 @@ class Method:  # pylint: disable=E1101,R0903,W0201
                 model_parameters[param] = settings.merged_settings[param]
         #
         result = {
-            "routing_key": None,
+            "routing_key": routing.router.route(
+                routing.INTERACTIVE_STREAM,
+                model=settings.merged_settings["model_name"],
+                location=_location(settings.merged_settings),
+            ),
             #
             "target": "plugins.vertex_ai_worker.utils.ai.Helper",
             "target_args": None,
             "target_kwargs": {
                 "project": settings.merged_settings["project"],
-                "location": settings.merged_settings["zone"],
+                "location": _location(settings.merged_settings),
                 "service_account_info": service_account_info,
                 "target_class": "langchain_google_vertexai.chat_models.ChatVertexAI",
                 "target_args": None,
@@ -368,21 +409,35 @@ class Method:  # pylint: disable=E1101,R0903,W0201
     #
 
     @web.method()
+    @metrics.instrument('callback:embed_documents')
     def embed_documents(  # pylint: disable=R0913
             self, settings, texts,
         ):
-        """ Make embeddings """
+        """ Make embeddings, settings["embeddings_task_type"] (e.g. RETRIEVAL_QUERY) overrides the document task type """
         service_account_info = settings["integration_data"]["settings"]["service_account_info"]
         model_name = settings["model_name"]
+        task_type = settings.get("embeddings_task_type")
+        #
+        method, method_kwargs = "embed_documents", {"texts": texts}
+        if task_type:
+            method, method_kwargs = "embed", {
+                "texts": texts,
+                "batch_size": 0,
+                "embeddings_task_type": task_type,
+            }
         #
         result = {
-            "routing_key": None,
+            "routing_key": routing.router.route(
+                routing.BULK_EMBED if not task_type else routing.INTERACTIVE_INVOKE,
+                model=model_name,
+                location=_location(settings["integration_data"]["settings"]),
+            ),
             #
             "target": "plugins.vertex_ai_worker.utils.ai.Helper",
             "target_args": None,
             "target_kwargs": {
                 "project": settings["integration_data"]["settings"]["project"],
-                "location": settings["integration_data"]["settings"]["zone"],
+                "location": _location(settings["integration_data"]["settings"]),
                 "service_account_info": service_account_info,
                 "target_class": "langchain_google_vertexai.embeddings.VertexAIEmbeddings",
                 "target_args": None,
@@ -392,16 +447,15 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             },
             "target_io_bound": True,
             #
-            "method": "embed_documents",
+            "method": method,
             "method_args": None,
-            "method_kwargs": {
-                "texts": texts,
-            },
+            "method_kwargs": method_kwargs,
         }
         #
         return result
 
     @web.method()
+    @metrics.instrument('callback:embed_query')
     def embed_query(  # pylint: disable=R0913
             self, settings, text,
         ):
@@ -410,13 +464,17 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         model_name = settings["model_name"]
         #
         result = {
-            "routing_key": None,
+            "routing_key": routing.router.route(
+                routing.INTERACTIVE_INVOKE,
+                model=model_name,
+                location=_location(settings["integration_data"]["settings"]),
+            ),
             #
             "target": "plugins.vertex_ai_worker.utils.ai.Helper",
             "target_args": None,
             "target_kwargs": {
                 "project": settings["integration_data"]["settings"]["project"],
-                "location": settings["integration_data"]["settings"]["zone"],
+                "location": _location(settings["integration_data"]["settings"]),
                 "service_account_info": service_account_info,
                 "target_class": "langchain_google_vertexai.embeddings.VertexAIEmbeddings",
                 "target_args": None,
@@ -440,6 +498,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
     #
 
     @web.method()
+    @metrics.instrument('callback:indexer_config')
     def indexer_config(  # pylint: disable=R0913
             self, settings, model,
         ):
@@ -459,7 +518,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         except (AttributeError, KeyError):
             project_id = None
         #
-        service_account_info = worker_client.unsecret_data(
+        service_account_info = unsecret_cached(
             settings["settings"]["service_account_info"], project_id
         )
         #
@@ -468,7 +527,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
                 "embedding_model": "plugins.vertex_ai_worker.utils.proxy.CredentialsProxy",
                 "embedding_model_params": {
                     "project": settings["settings"]["project"],
-                    "location": settings["settings"]["zone"],
+                    "location": _location(settings["settings"]),
                     "service_account_info": service_account_info,
                     #
                     "target_class": "langchain_google_vertexai.embeddings.VertexAIEmbeddings",
@@ -490,7 +549,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
                 "ai_model": "plugins.vertex_ai_worker.utils.proxy.CredentialsProxy",
                 "ai_model_params": {
                     "project": settings["settings"]["project"],
-                    "location": settings["settings"]["zone"],
+                    "location": _location(settings["settings"]),
                     "service_account_info": service_account_info,
                     #
                     "target_class": "langchain_google_vertexai.llms.VertexAI",
@@ -507,7 +566,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             "ai_model": "plugins.vertex_ai_worker.utils.proxy.CredentialsProxy",
             "ai_model_params": {
                 "project": settings["settings"]["project"],
-                "location": settings["settings"]["zone"],
+                "location": _location(settings["settings"]),
                 "service_account_info": service_account_info,
                 #
                 "target_class": "langchain_google_vertexai.chat_models.ChatVertexAI",
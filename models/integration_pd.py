@@ -1,18 +1,97 @@
+import hashlib
 import json
+import threading
+import time
 from typing import List, Optional, Union
 
-from pydantic.v1 import BaseModel, root_validator, validator
+from pydantic.v1 import BaseModel, PrivateAttr, root_validator, validator
 from pylon.core.tools import log
 
 from tools import session_project, rpc_tools, VaultClient, worker_client, this, SecretString
 
+from ..helpers.cache import TTLCache
+from ..helpers.secrets import raw_value
 
-def get_token_limits():
+
+TOKEN_LIMITS_TTL = 300
+SETTINGS_CACHE_SIZE = 256
+
+
+def read_token_limits():
     vault_client = VaultClient()
     secrets = vault_client.get_all_secrets()
     return json.loads(secrets.get('vertex_ai_token_limits', ''))
 
 
+def write_token_limits(limits: dict):
+    vault_client = VaultClient()
+    secrets = vault_client.get_all_secrets()
+    secrets['vertex_ai_token_limits'] = json.dumps(limits)
+    vault_client.set_secrets(secrets)
+    token_limits.invalidate()
+
+
+class TokenLimitRegistry:
+    """ vertex_ai_token_limits secret cached in memory, re-read after TTL """
+
+    def __init__(self, ttl=TOKEN_LIMITS_TTL):
+        self.ttl = ttl
+        self._limits = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def load(self, limits=None):
+        """ Set limits, reading them from Vault if not given """
+        if limits is None:
+            limits = read_token_limits()
+        with self._lock:
+            self._limits = limits
+            self._loaded_at = time.monotonic()
+        return limits
+
+    def invalidate(self):
+        """ Force re-read on next lookup, e.g. after the secret has changed """
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def _stale(self) -> bool:
+        return self._limits is None or time.monotonic() - self._loaded_at > self.ttl
+
+    @property
+    def limits(self) -> dict:
+        if not self._stale():
+            return self._limits
+        # single flight: one thread reads Vault, others keep serving cached limits
+        if self._limits is not None:
+            if not self._reload_lock.acquire(blocking=False):
+                return self._limits
+        else:
+            self._reload_lock.acquire()
+        try:
+            if self._stale():
+                try:
+                    self.load()
+                except Exception:  # pylint: disable=W0703
+                    if self._limits is None:
+                        raise
+                    log.exception('Failed to reload token limits, keeping cached ones')
+                    self._loaded_at = time.monotonic()
+        finally:
+            self._reload_lock.release()
+        return self._limits
+
+    def get(self, base_model_id, default=None):
+        return self.limits.get(base_model_id, default)
+
+
+token_limits = TokenLimitRegistry()
+
+
+def get_token_limits():
+    return token_limits.limits
+
+
 class TokenLimitModel(BaseModel):
     input: int
     output: int
@@ -34,10 +113,14 @@ class AIModel(BaseModel):
     def token_limit_validator(cls, value, values):
         if value:
             return value
-        token_limits = get_token_limits()
         return token_limits.get(values.get('id').split('@')[0], TokenLimitModel(input=8192, output=1024))
 
 
+def settings_fingerprint(settings: dict) -> str:
+    payload = json.dumps(settings, sort_keys=True, default=raw_value)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
 class IntegrationModel(BaseModel):
     service_account_info: Union[SecretString, str]
     project: str
@@ -49,6 +132,20 @@ class IntegrationModel(BaseModel):
     top_p: float = 0.8
     top_k: int = 40
     tuned_model_name: str = ''
+    response_cache: bool = False
+    response_cache_ttl: int = 3600
+    fallback_zones: List[str] = []
+    hedging: bool = False
+    hedge_min_delay: float = 0.5
+    stream_min_chunk_bytes: int = 0
+    stream_max_hold_ms: int = 50
+    quota_requests_per_minute: Optional[int] = None
+    quota_tokens_per_minute: Optional[int] = None
+    admission_timeout: float = 0.0
+    max_retries: int = 2
+    retry_base_delay: float = 0.2
+
+    _model_index: Optional[dict] = PrivateAttr(default=None)
 
     @root_validator(pre=True)
     def prepare_model_list(cls, values):
@@ -57,12 +154,39 @@ class IntegrationModel(BaseModel):
             values['models'] = [AIModel(id=model, name=model).dict(by_alias=True) for model in models]
         return values
 
+    @classmethod
+    def parse_cached(cls, settings) -> 'IntegrationModel':
+        """ parse_obj memoized by settings fingerprint, result must not be mutated """
+        if isinstance(settings, cls):
+            return settings
+        key = settings_fingerprint(settings)
+        return _parsed_settings.get_or_create(key, lambda: cls.parse_obj(settings))
+
+    @property
+    def model_index(self) -> dict:
+        """ Model id -> AIModel, first one wins like a linear scan """
+        if self._model_index is None:
+            index = {}
+            for model in self.models:
+                index.setdefault(model.id, model)
+            self._model_index = index
+        return self._model_index
+
+    def get_capabilities(self, model_name) -> dict:
+        model = self.model_index.get(model_name)
+        return model.capabilities.dict() if model else {}
+
     @property
     def input_token_limit(self):
-        return next((model.token_limit.input for model in self.models if model.id == self.model_name), 1024)
+        return self.get_input_token_limit(self.model_name)
 
     def get_input_token_limit(self, model_name):
-        return next((model.token_limit.input for model in self.models if model.id == model_name), 1024)
+        model = self.model_index.get(model_name)
+        return model.token_limit.input if model else 1024
+
+    def get_output_token_limit(self, model_name):
+        model = self.model_index.get(model_name)
+        return model.token_limit.output if model else 1024
 
     def check_connection(self, project_id=None):
         if not project_id:
@@ -86,6 +210,13 @@ class IntegrationModel(BaseModel):
         return getattr(rpc_tools.RpcMixin().rpc.call, f'{integration_name}_set_models')(payload)
 
 
+_parsed_settings = TTLCache(maxsize=SETTINGS_CACHE_SIZE, ttl=TOKEN_LIMITS_TTL)
+
+
+def settings_cache_info() -> dict:
+    return _parsed_settings.info()
+
+
 class VertexAISettings(BaseModel):
     model_name: str = 'text-bison@001'
     temperature: float = 1.0
@@ -18,39 +18,55 @@ class ChatCompletionRequestBody(BaseModel):
 
     @root_validator(pre=True)
     def prepare_data(cls, values: dict) -> dict:
-        examples = []
-        message_history = []
-        if values.get('messages'):
-            for idx, message in enumerate(values['messages']):
-                if message['role'] == 'system' and not message.get('name'):
-                    values['context'] = message['content']
-                if message.get("name") == "example_user":
-                    for j in range(idx + 1, len(values['messages'])):
-                        if values['messages'][j].get("name") == "example_assistant":
-                            example = {
-                                "input_text": message["content"],
-                                "output_text": values['messages'][j]["content"]
-                            }
-                            examples.append(example)
-                            break
-                if message['role'] == 'user' and idx != len(values['messages']) - 1:
-                    message_history.append({
-                        'author': 'user',
-                        'content': message["content"]
-                    })
-                if message['role'] == 'assistant':
-                    message_history.append({
-                        'author': 'bot',
-                        'content': message["content"]
-                    })
-        values['examples'] = list(map(lambda x: InputOutputTextPair(**x), examples))
-        values['message_history'] = list(map(lambda x: ChatMessage(**x), message_history))
+        values.update(translate_messages(values.get('messages')))
         if not values.get('max_output_tokens'):
             values['max_output_tokens'] = values.get('max_tokens')
 
         return values
 
 
+def translate_messages(messages: Optional[list]) -> dict:
+    """ OpenAI messages -> Vertex context, examples and message_history in one reverse pass.
+    context is the last unnamed system message, every example_user is paired with the
+    nearest example_assistant after it, the last user message is the prompt and is skipped """
+    examples = []
+    message_history = []
+    result = {}
+    next_example_idx = None
+    last_idx = len(messages) - 1 if messages else -1
+    for idx in range(last_idx, -1, -1):
+        message = messages[idx]
+        name = message.get('name')
+        role = message['role']
+        if role == 'system' and not name and 'context' not in result:
+            result['context'] = message['content']
+        if name == 'example_user':
+            if next_example_idx is not None:
+                examples.append(InputOutputTextPair(
+                    input_text=message['content'], output_text=messages[next_example_idx]['content']
+                ))
+        elif name == 'example_assistant':
+            next_example_idx = idx
+        if role == 'user' and idx != last_idx:
+            message_history.append(ChatMessage(content=message['content'], author='user'))
+        elif role == 'assistant':
+            message_history.append(ChatMessage(content=message['content'], author='bot'))
+    examples.reverse()
+    message_history.reverse()
+    result['examples'] = examples
+    result['message_history'] = message_history
+    return result
+
+
+def parse_chat_request(request_data: dict) -> dict:
+    """ Same as ChatCompletionRequestBody.validate(request_data).dict(exclude_unset=True),
+    but messages are translated once and only scalar parameters go through pydantic """
+    values = {key: value for key, value in request_data.items() if key != 'messages'}
+    params = ChatCompletionRequestBody.validate(values).dict(exclude_unset=True)
+    params.update(translate_messages(request_data.get('messages')))
+    return params
+
+
 class CompletionRequestBody(BaseModel):
     prompt: str
     max_output_tokens: int | None = None
@@ -24,7 +24,13 @@ from pylon.core.tools import module  # pylint: disable=E0611,E0401
 
 from tools import VaultClient, worker_client  # pylint: disable=E0611,E0401
 
-from .models.integration_pd import IntegrationModel
+from .models.integration_pd import IntegrationModel, token_limits, write_token_limits
+from .helpers.aio import event_loop
+from .helpers.embedding_cache import configure_embedding_cache
+from .helpers.batcher import embed_query_batcher
+from .helpers.routing import router
+from .helpers.tokenizer import configure_tokenizer
+from .helpers.warmup import startup_warm_up
 
 
 TOKEN_LIMITS = {
@@ -81,6 +87,14 @@ class Module(module.ModuleModel):
         #
         self.descriptor.init_all()
         #
+        configure_embedding_cache(
+            self.descriptor.config.get("embedding_cache_dir"),
+            self.descriptor.config.get("embedding_cache_max_store_mb"),
+        )
+        embed_query_batcher.configure(**self.descriptor.config.get("embed_query_batching", {}))
+        router.configure(self.descriptor.config.get("routing", {}))
+        configure_tokenizer(self.descriptor.config.get("tokenizer_data_dir"))
+        #
         # Register template slot callback
         self.context.rpc_manager.call.integrations_register_section(
             name=SECTION_NAME,
@@ -95,8 +109,9 @@ class Module(module.ModuleModel):
         vault_client = VaultClient()
         secrets = vault_client.get_all_secrets()
         if 'vertex_ai_token_limits' not in secrets:
+            write_token_limits(TOKEN_LIMITS)
             secrets['vertex_ai_token_limits'] = json.dumps(TOKEN_LIMITS)
-            vault_client.set_secrets(secrets)
+        token_limits.load(json.loads(secrets['vertex_ai_token_limits']))
         #
         worker_client.register_integration(
             integration_name=self.descriptor.name,
@@ -116,9 +131,21 @@ class Module(module.ModuleModel):
             #
             indexer_config_callback=self.indexer_config,
         )
+        #
+        warm_up_config = self.descriptor.config.get("warm_up", {})
+        if warm_up_config.get("enabled", False):
+            from .utils import warm_up_parts  # pylint: disable=C0415
+            startup_warm_up.start(
+                warm_up_parts,
+                lambda part: part(),
+                concurrency=warm_up_config.get("concurrency", 4),
+                deadline=warm_up_config.get("deadline", 120),
+            )
 
     def deinit(self):  # pylint: disable=R0201
         """ De-init module """
         log.info("De-initializing GCP Integration")
         #
+        event_loop.stop()
+        #
         self.descriptor.deinit_all()
@@ -5,7 +5,87 @@ from pylon.core.tools import web, log
 from tools import rpc_tools, worker_client, this, SecretString
 from pydantic.v1 import ValidationError
 
-from ..models.integration_pd import VertexAISettings, AIModel
+from ..models.integration_pd import (
+    VertexAISettings, AIModel, IntegrationModel, TokenLimitModel, settings_cache_info, token_limits,
+    write_token_limits,
+)
+from ..helpers.sessions import invalidate_sessions, session_cache_info
+from ..helpers.tokenizer import token_cache_info
+from ..helpers.registry import model_registry, evict_project_models
+from ..helpers.response_cache import get_response_cache
+from ..helpers.embedding_cache import get_embedding_cache
+from ..helpers.batcher import embed_query_batcher
+from ..helpers.secrets import invalidate_secrets, secret_cache_info, secret_fingerprint
+from ..helpers.routing import router
+from ..helpers import metrics
+from ..helpers.admission import admission
+from ..helpers.resilience import resilience_info
+from ..helpers.warmup import startup_warm_up
+from ..helpers.token_estimator import token_estimator
+
+
+DOCUMENT_TASK_TYPE = "RETRIEVAL_DOCUMENT"
+QUERY_TASK_TYPE = "RETRIEVAL_QUERY"
+
+
+def _embed_texts(settings, texts, task_type=DOCUMENT_TASK_TYPE):
+    # worker_client forwards (settings, texts) only, the task type travels in settings
+    task_settings = settings if task_type == DOCUMENT_TASK_TYPE else {**settings, "embeddings_task_type": task_type}
+    #
+    def _embed(missing):
+        return worker_client.embed_documents(
+            integration_name=this.module_name,
+            settings=task_settings,
+            texts=missing,
+        )
+    #
+    integration_settings = settings["integration_data"]["settings"]
+    scope = (
+        integration_settings["project"],
+        secret_fingerprint(integration_settings["service_account_info"]),
+        task_type,
+    )
+    return get_embedding_cache().embed(scope, settings["model_name"], texts, _embed)
+
+
+def _input_token_limit(merged_settings: dict) -> int:
+    """ Input limit of merged_settings["model_name"], matched by name like Method.count_tokens """
+    model_name = merged_settings["model_name"]
+    for model_data in merged_settings.get("models", []):
+        if isinstance(model_data, str):
+            model_data = {"id": model_data, "name": model_data}
+        if model_data.get("name") == model_name:
+            return AIModel.parse_obj(model_data).token_limit.input
+    return token_limits.get(model_name.split('@')[0], TokenLimitModel(input=8192, output=1024)).input
+
+
+def collect_cache_stats():
+    return {
+        "settings": settings_cache_info(),
+        "sessions": session_cache_info(),
+        "secrets": secret_cache_info(),
+        "token_counts": token_cache_info(),
+        "model_handles": model_registry.info(),
+        "responses": get_response_cache().info(),
+        "embeddings": get_embedding_cache().info(),
+        "embed_query_batches": embed_query_batcher.info(),
+    }
+
+
+@metrics.registry.collector
+def _cache_metrics():
+    stats = collect_cache_stats()
+    gauges = []
+    for field, name, documentation in (
+            ("hits", "vertex_ai_cache_hits", "Cache hits"),
+            ("misses", "vertex_ai_cache_misses", "Cache misses"),
+            ("hit_ratio", "vertex_ai_cache_hit_ratio", "Cache hit ratio"),
+            ("size", "vertex_ai_cache_size", "Cache entries"),
+    ):
+        gauges.append((name, documentation, {
+            (("cache", cache),): info[field] for cache, info in stats.items() if field in info
+        }))
+    return gauges
 
 
 class RPC:
@@ -13,13 +93,13 @@ class RPC:
 
     @web.rpc(f'{integration_name}__predict')
     @rpc_tools.wrap_exceptions(RuntimeError)
+    @metrics.instrument('predict')
     def predict(self, project_id: int, settings: dict, prompt_struct: dict):
         from ..utils import predict_chat, predict_text, prepare_result  # pylint: disable=C0415
         #
-        models = settings.get('models', [])
-        capabilities = next((model['capabilities'] for model in models if model['id'] == settings['model_name']), {})
         """ Predict function """
         try:
+            capabilities = IntegrationModel.parse_cached(settings).get_capabilities(settings['model_name'])
             if capabilities.get('chat_completion'):
                 log.info('Using chat prediction for model: %s', settings['model_name'])
                 stream = settings.get('stream')
@@ -35,8 +115,32 @@ class RPC:
 
         return {"ok": True, "response": prepare_result(result)}
 
+    @web.rpc(f'{integration_name}__predict_stream')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    @metrics.instrument('predict_stream')
+    def predict_stream(self, project_id: int, settings: dict, prompt_struct: dict):
+        """ Predict function, response is a generator of prepare_result chunks """
+        from ..utils import predict_chat_stream, predict_text_stream, prepare_result  # pylint: disable=C0415
+        #
+        try:
+            capabilities = IntegrationModel.parse_cached(settings).get_capabilities(settings['model_name'])
+            if capabilities.get('chat_completion'):
+                log.info('Using chat stream prediction for model: %s', settings['model_name'])
+                chunks = predict_chat_stream(project_id, settings, prompt_struct)
+            elif capabilities.get('completion'):
+                log.info('Using completion(text) stream prediction for model: %s', settings['model_name'])
+                chunks = predict_text_stream(project_id, settings, prompt_struct)
+            else:
+                raise Exception(f"Model {settings['model_name']} does not support chat or text completion")
+        except Exception as e:
+            log.error(format_exc())
+            return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+
+        return {"ok": True, "response": (prepare_result(chunk) for chunk in chunks)}
+
     @web.rpc(f'{integration_name}__chat_completion')
     @rpc_tools.wrap_exceptions(RuntimeError)
+    @metrics.instrument('chat_completion')
     def chat_completion(self, project_id, settings, request_data):
         """ Chat completion function """
         from ..utils import predict_chat_from_request  # pylint: disable=C0415
@@ -51,6 +155,7 @@ class RPC:
 
     @web.rpc(f'{integration_name}__completion')
     @rpc_tools.wrap_exceptions(RuntimeError)
+    @metrics.instrument('completion')
     def completion(self, project_id, settings, request_data):
         """ Completion function """
         from ..utils import predict_from_request  # pylint: disable=C0415
@@ -64,6 +169,101 @@ class RPC:
 
         return {"ok": True, "response": result}
 
+    @web.rpc(f'{integration_name}__chat_completion_batch')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    @metrics.instrument('chat_completion_batch')
+    def chat_completion_batch(self, project_id, settings, requests, concurrency=None):
+        """ Chat completion for list of request_data, errors are reported per item """
+        from ..utils import predict_chat_batch, BATCH_CONCURRENCY  # pylint: disable=C0415
+        #
+        try:
+            result = predict_chat_batch(project_id, settings, requests, concurrency or BATCH_CONCURRENCY)
+        except Exception as e:
+            log.error(format_exc())
+            return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+
+        return {"ok": True, "response": result}
+
+    @web.rpc(f'{integration_name}__completion_batch')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    @metrics.instrument('completion_batch')
+    def completion_batch(self, project_id, settings, requests, concurrency=None):
+        """ Completion for list of request_data, errors are reported per item """
+        from ..utils import predict_batch, BATCH_CONCURRENCY  # pylint: disable=C0415
+        #
+        try:
+            result = predict_batch(project_id, settings, requests, concurrency or BATCH_CONCURRENCY)
+        except Exception as e:
+            log.error(format_exc())
+            return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+
+        return {"ok": True, "response": result}
+
+    @web.rpc(f'{integration_name}__embed_documents')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    @metrics.instrument('embed_documents')
+    def embed_documents(self, settings, texts):
+        """ Make embeddings, sending only texts missing from embedding cache upstream """
+        try:
+            result = _embed_texts(settings, texts)
+        except Exception as e:
+            log.error(format_exc())
+            return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+
+        return {"ok": True, "response": result}
+
+    @web.rpc(f'{integration_name}__embed_query')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    @metrics.instrument('embed_query')
+    def embed_query(self, settings, text):
+        """ Make embedding, concurrent queries for the same model are sent as one batch """
+        integration_settings = settings["integration_data"]["settings"]
+        batch_key = (
+            integration_settings["project"],
+            integration_settings["zone"],
+            settings["model_name"],
+            secret_fingerprint(integration_settings["service_account_info"]),
+        )
+        try:
+            result = embed_query_batcher.submit(
+                batch_key, text, lambda texts: _embed_texts(settings, texts, QUERY_TASK_TYPE)
+            )
+        except Exception as e:
+            log.error(format_exc())
+            return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+
+        return {"ok": True, "response": result}
+
+    @web.rpc(f'{integration_name}__count_tokens')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    @metrics.instrument('count_tokens')
+    def count_tokens(self, settings, data):
+        """ Calibrated local token count, asks the worker only near the model input limit.
+        settings is the same object the count_tokens callback gets (merged_settings, integration) """
+        def _count_remote(remote_data):
+            return worker_client.ai_count_tokens(
+                integration_name=this.module_name,
+                settings=settings,
+                data=remote_data,
+            )
+        #
+        try:
+            merged_settings = settings.merged_settings
+            result = token_estimator.count(
+                merged_settings["model_name"], data, _input_token_limit(merged_settings), _count_remote
+            )
+        except Exception as e:
+            log.error(format_exc())
+            return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+
+        return {"ok": True, "response": result}
+
+    @web.rpc(f'{integration_name}__token_estimator_stats', 'token_estimator_stats')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def token_estimator_stats(self):
+        """ Local/remote count split and calibrated ratio per model """
+        return token_estimator.info()
+
     @web.rpc(f'{integration_name}__parse_settings')
     @rpc_tools.wrap_exceptions(RuntimeError)
     def parse_settings(self, settings):
@@ -73,9 +273,69 @@ class RPC:
             return {"ok": False, "error": e}
         return {"ok": True, "item": settings}
 
+    @web.rpc(f'{integration_name}__warm_up', 'warm_up')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def warm_up(self):
+        """ Import Vertex AI SDK and tokenizer now instead of on the first prediction """
+        from ..utils import warm_up  # pylint: disable=C0415
+        try:
+            warm_up()
+        except Exception as e:
+            log.error(format_exc())
+            return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+        return {"ok": True}
+
+    @web.rpc(f'{integration_name}__warm_up_status', 'warm_up_status')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def warm_up_status(self):
+        """ Readiness of the process-wide startup warm-up (SDK import, tokenizer) """
+        return startup_warm_up.info()
+
+    @web.rpc(f'{integration_name}__cache_stats', 'cache_stats')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def cache_stats(self):
+        """ Hit/miss counters of in-process caches """
+        return collect_cache_stats()
+
+    @web.rpc(f'{integration_name}__routing_stats', 'routing_stats')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def routing_stats(self):
+        """ Worker tasks dispatched per routing lane """
+        return router.info()
+
+    @web.rpc(f'{integration_name}__admission_stats', 'admission_stats')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def admission_stats(self):
+        """ Local quota admission counters """
+        return admission.info()
+
+    @web.rpc(f'{integration_name}__resilience_stats', 'resilience_stats')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def resilience_stats(self):
+        """ Circuit breaker states and retry budget """
+        return resilience_info()
+
+    @web.rpc(f'{integration_name}__set_token_limits', 'set_token_limits')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def set_token_limits(self, limits: dict):
+        """ Store vertex_ai_token_limits secret and drop the cached copy """
+        write_token_limits(limits)
+        return {"ok": True}
+
+    @web.rpc(f'{integration_name}__token_limits_changed', 'token_limits_changed')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def token_limits_changed(self):
+        """ Notification that vertex_ai_token_limits was changed elsewhere, re-read on next lookup """
+        token_limits.invalidate()
+        return {"ok": True}
+
     @web.rpc(f'{integration_name}_set_models', 'set_models')
     @rpc_tools.wrap_exceptions(RuntimeError)
     def set_models(self, payload: dict):
+        invalidate_sessions(payload.get('project_id'))
+        evict_project_models(payload.get('project_id'))
+        invalidate_secrets(payload.get('project_id'))
+        #
         api_token = payload['settings'].get('service_account_info', {})
         #
         if isinstance(api_token, SecretString):
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Load the plugin as package vertex_ai without running its pylon entry point """
+
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "vertex_ai"
+RUNTIME_DEPENDENCIES = ("pylon", "tools", "pydantic")
+
+
+class WhitespaceEncoding:
+    """ Stand-in for tiktoken encoding: one token per whitespace separated word """
+
+    @staticmethod
+    def encode(text):
+        return text.split()
+
+
+@pytest.fixture(scope="session")
+def plugin():
+    for dependency in RUNTIME_DEPENDENCIES:
+        pytest.importorskip(dependency)
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [PLUGIN_DIR]
+        sys.modules[PACKAGE_NAME] = package
+    return importlib.import_module(PACKAGE_NAME)
+
+
+@pytest.fixture
+def tokenizer(plugin, monkeypatch):  # pylint: disable=W0621,W0613
+    module = importlib.import_module(f"{PACKAGE_NAME}.helpers.tokenizer")
+    monkeypatch.setattr(module, "_encoding", WhitespaceEncoding())
+    module._token_counts.invalidate()  # pylint: disable=W0212
+    return module
+
+
+@pytest.fixture
+def utils(tokenizer):  # pylint: disable=W0621,W0613
+    return importlib.import_module(f"{PACKAGE_NAME}.utils")
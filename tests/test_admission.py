@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Token bucket admission control """
+
+import asyncio
+import importlib
+import time
+
+import pytest
+
+
+@pytest.fixture
+def admission(plugin):  # pylint: disable=W0613
+    return importlib.import_module("vertex_ai.helpers.admission")
+
+
+KEY = ("project", "us-central1", "chat-bison")
+
+
+def test_no_quota_is_not_limited(admission):
+    controller = admission.AdmissionController()
+    for _ in range(100):
+        controller.acquire(KEY, tokens=10 ** 6)
+    assert controller.info()["admitted"] == 0
+
+
+def test_requests_over_rpm_are_rejected_past_timeout(admission):
+    controller = admission.AdmissionController()
+    for _ in range(60):
+        controller.acquire(KEY, rpm=60)
+    with pytest.raises(admission.AdmissionRejected):
+        controller.acquire(KEY, rpm=60, timeout=0.1)
+    assert controller.info() == {"admitted": 60, "queued": 0, "rejected": 1, "keys": 1}
+
+
+def test_requests_over_rpm_wait_for_refill(admission):
+    controller = admission.AdmissionController()
+    for _ in range(600):
+        controller.acquire(KEY, rpm=600)
+    started = time.monotonic()
+    controller.acquire(KEY, rpm=600, timeout=1)
+    assert 0.05 <= time.monotonic() - started < 1
+    assert controller.info()["queued"] == 1
+
+
+def test_tokens_are_capped_at_capacity(admission):
+    controller = admission.AdmissionController()
+    controller.acquire(KEY, tpm=1000, tokens=5000)
+    with pytest.raises(admission.AdmissionRejected):
+        controller.acquire(KEY, tpm=1000, tokens=1)
+
+
+def test_async_acquire_waits_without_blocking_loop(admission):
+    controller = admission.AdmissionController()
+    for _ in range(600):
+        controller.acquire(KEY, rpm=600)
+    ticks = []
+    #
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+    #
+    async def main():
+        await asyncio.gather(controller.acquire_async(KEY, rpm=600, timeout=1), ticker())
+    #
+    asyncio.run(main())
+    assert len(ticks) == 5
+    assert controller.info()["admitted"] == 601
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" vertex_ai__count_tokens: local estimate and remote fallback near the input limit """
+
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def rpc_main(tokenizer, monkeypatch):  # pylint: disable=W0613
+    module = importlib.import_module("vertex_ai.rpc.main")
+    estimator = importlib.import_module("vertex_ai.helpers.token_estimator")
+    monkeypatch.setattr(module, "token_estimator", estimator.TokenEstimator())
+    return module
+
+
+@pytest.fixture
+def remote_calls(rpc_main, monkeypatch):
+    calls = []
+    #
+    def ai_count_tokens(integration_name, settings, data):
+        calls.append((integration_name, settings, data))
+        return 123
+    #
+    monkeypatch.setattr(rpc_main.worker_client, "ai_count_tokens", ai_count_tokens, raising=False)
+    return calls
+
+
+def callback_settings(input_limit):
+    """ Same shape the count_tokens callback receives """
+    return SimpleNamespace(
+        integration=SimpleNamespace(project_id=1),
+        merged_settings={
+            "model_name": "chat-bison@002",
+            "project": "project", "zone": "us-central1", "service_account_info": "{}",
+            "models": [{
+                "id": "chat-bison@002", "name": "chat-bison@002",
+                "capabilities": {"completion": False, "chat_completion": True, "embeddings": False},
+                "token_limit": {"input": input_limit, "output": 1024},
+            }],
+        },
+    )
+
+
+def test_far_from_limit_is_counted_locally(rpc_main, remote_calls):
+    result = rpc_main.RPC().count_tokens(callback_settings(8192), "w " * 20)
+    assert result["ok"]
+    assert result["response"]["estimated"]
+    assert result["response"]["count"] == 20
+    assert not remote_calls
+
+
+def test_near_limit_falls_back_to_worker(rpc_main, remote_calls):
+    settings = callback_settings(100)
+    data = [{"role": "user", "content": "w " * 90}]
+    result = rpc_main.RPC().count_tokens(settings, data)
+    assert result["ok"]
+    assert result["response"] == {"count": 123, "estimated": False, "error_bound": 0}
+    assert remote_calls == [("vertex_ai", settings, data)]
+    assert rpc_main.token_estimator.info()["models"]["chat-bison@002"]["samples"] == 1
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Zone failover and hedged calls """
+
+import contextvars
+import importlib
+import threading
+
+import pytest
+
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.fixture
+def failover(plugin, monkeypatch):  # pylint: disable=W0613
+    module = importlib.import_module("vertex_ai.helpers.failover")
+    monkeypatch.setattr(module, "zone_health", module.ZoneHealth())
+    return module
+
+
+def zone_call(outcomes, delays=None):
+    """ call(zone) that raises or returns outcomes[zone] after delays[zone], records zones called """
+    called = []
+    released = threading.Event()
+    #
+    def call(zone):
+        called.append(zone)
+        if delays and zone in delays:
+            released.wait(delays[zone])
+        outcome = outcomes[zone]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    #
+    call.called = called
+    call.released = released
+    return call
+
+
+def test_failover_tries_next_zone(failover):
+    call = zone_call({"a": ConnectionError("a"), "b": "b"})
+    assert failover.call_with_failover("p", ["a", "b"], call) == "b"
+    assert not failover.zone_health.is_healthy(("p", "a"))
+    assert failover.candidate_zones("p", "a", ["b"]) == ["b", "a"]
+
+
+def test_failover_raises_non_retryable(failover):
+    call = zone_call({"a": ValueError("bad"), "b": "b"})
+    with pytest.raises(ValueError):
+        failover.call_with_failover("p", ["a", "b"], call)
+    assert call.called == ["a"]
+
+
+def test_hedged_fast_failure_tries_secondary(failover):
+    call = zone_call({"a": ConnectionError("a"), "b": "b", "c": "c"})
+    assert failover.call_hedged("p", ["a", "b", "c"], call, min_delay=5) == "b"
+    assert call.called == ["a", "b"]
+
+
+def test_hedged_fast_failures_reach_last_zone(failover):
+    call = zone_call({"a": ConnectionError("a"), "b": ConnectionError("b"), "c": "c"})
+    assert failover.call_hedged("p", ["a", "b", "c"], call, min_delay=5) == "c"
+    assert call.called == ["a", "b", "c"]
+
+
+def test_hedged_slow_primary_is_hedged(failover):
+    call = zone_call({"a": "a", "b": "b"}, delays={"a": 5})
+    try:
+        assert failover.call_hedged("p", ["a", "b"], call, min_delay=0.05) == "b"
+    finally:
+        call.released.set()
+    assert call.called == ["a", "b"]
+
+
+def test_hedged_non_retryable_is_raised(failover):
+    call = zone_call({"a": ValueError("bad"), "b": "b"})
+    with pytest.raises(ValueError):
+        failover.call_hedged("p", ["a", "b"], call, min_delay=5)
+    assert call.called == ["a"]
+
+
+def test_hedged_calls_see_caller_context(failover):
+    seen = []
+    #
+    def call(zone):
+        seen.append(request_id.get())
+        return zone
+    #
+    token = request_id.set("req-1")
+    try:
+        assert failover.call_hedged("p", ["a", "b"], call, min_delay=5) == "a"
+    finally:
+        request_id.reset(token)
+    assert seen == ["req-1"]
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" prepare_conversation keeps the output of the original message-by-message loop """
+
+import random
+from collections import deque
+
+import pytest
+
+
+def reference_prepare_conversation(utils, prompt_struct, token_input_limit):
+    """ Original implementation, one message at a time """
+    conversation = {'context': '', 'examples': [], 'chat_history': deque(), 'prompt': ''}
+    tokens_left = token_input_limit
+    #
+    if prompt_struct.get('context'):
+        tokens_left -= utils.num_tokens_from_messages(prompt_struct['context'])
+        if tokens_left < 0:
+            return conversation, tokens_left
+        conversation['context'] = prompt_struct['context']
+    #
+    if prompt_struct.get('prompt'):
+        tokens_left -= utils.num_tokens_from_messages(prompt_struct['prompt'])
+        if tokens_left < 0:
+            return conversation, tokens_left
+        conversation['prompt'] = prompt_struct['prompt']
+    #
+    if prompt_struct.get('examples'):
+        for example in prompt_struct['examples']:
+            tokens_left -= utils.num_tokens_from_messages(example)
+            if tokens_left < 0:
+                return conversation, tokens_left
+            conversation['examples'].append(example)
+    #
+    if prompt_struct.get('chat_history'):
+        for message in reversed(prompt_struct['chat_history']):
+            if isinstance(message, dict):
+                message = utils.MessageModel(**message).dict()
+            tokens_left -= utils.num_tokens_from_messages(message)
+            if tokens_left < 0:
+                break
+            conversation['chat_history'].appendleft(message)
+    #
+    if len(conversation['chat_history']) % 2:
+        conversation['chat_history'].popleft()
+    #
+    return conversation, tokens_left
+
+
+def words(rng, low=0, high=12):
+    return " ".join("w" for _ in range(rng.randint(low, high)))
+
+
+def random_prompt_struct(rng):
+    return {
+        'context': words(rng) if rng.random() < 0.8 else '',
+        'prompt': words(rng) if rng.random() < 0.9 else '',
+        'examples': [
+            {'input': words(rng), 'output': words(rng)} for _ in range(rng.randint(0, 3))
+        ],
+        'chat_history': [
+            {'role': rng.choice(['user', 'ai', 'assistant']), 'content': words(rng)}
+            for _ in range(rng.randint(0, 120))
+        ],
+    }
+
+
+def test_matches_reference_on_random_conversations(utils):
+    rng = random.Random(20240101)
+    for _ in range(2000):
+        prompt_struct = random_prompt_struct(rng)
+        limit = rng.randint(0, 600)
+        assert utils.prepare_conversation(prompt_struct, limit) == \
+            reference_prepare_conversation(utils, prompt_struct, limit)
+
+
+def test_cut_point_and_odd_length_pop(utils):
+    history = [{'role': 'user', 'content': 'w w'}] * 5  # 7 tokens each: author, content, overhead
+    prompt_struct = {'context': '', 'prompt': 'w', 'examples': [], 'chat_history': history}
+    # prompt takes 5, three messages fit in 26, odd history drops its oldest message
+    conversation, tokens_left = utils.prepare_conversation(prompt_struct, 26)
+    assert len(conversation['chat_history']) == 2
+    assert tokens_left == 26 - 5 - 4 * 7
+    assert (conversation, tokens_left) == reference_prepare_conversation(utils, prompt_struct, 26)
+
+
+def test_tokens_left_on_overflow(utils):
+    prompt_struct = {'context': 'w ' * 50, 'prompt': 'w', 'examples': [], 'chat_history': []}
+    conversation, tokens_left = utils.prepare_conversation(prompt_struct, 10)
+    assert conversation['context'] == ''
+    assert tokens_left == 10 - 54
+    assert (conversation, tokens_left) == reference_prepare_conversation(utils, prompt_struct, 10)
+
+
+def test_malformed_message_past_cut_is_ignored(utils):
+    history = [{'role': 'user'}] + [{'role': 'user', 'content': 'w'}] * 40
+    prompt_struct = {'context': '', 'prompt': '', 'examples': [], 'chat_history': history}
+    conversation, _ = utils.prepare_conversation(prompt_struct, 50)
+    assert len(conversation['chat_history']) == 8
+
+
+def test_malformed_message_before_cut_raises(utils):
+    history = [{'role': 'user'}] + [{'role': 'user', 'content': 'w'}] * 4
+    prompt_struct = {'context': '', 'prompt': '', 'examples': [], 'chat_history': history}
+    with pytest.raises(Exception):
+        utils.prepare_conversation(prompt_struct, 1000)
@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Model handle registry and session activation under concurrency """
+
+import importlib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def registry(plugin):  # pylint: disable=W0613
+    return importlib.import_module("vertex_ai.helpers.registry")
+
+
+@pytest.fixture
+def sessions(plugin, monkeypatch):  # pylint: disable=W0613
+    configs = []
+    monkeypatch.setitem(sys.modules, "vertexai", SimpleNamespace(init=lambda **kwargs: configs.append(kwargs)))
+    module = importlib.import_module("vertex_ai.helpers.sessions")
+    monkeypatch.setattr(module, "_active_session", None)
+    module.configs = configs
+    return module
+
+
+def test_concurrent_misses_load_once(registry):
+    models = registry.ModelRegistry()
+    calls = []
+    #
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+    #
+    with ThreadPoolExecutor(8) as pool:
+        handles = list(pool.map(lambda _: models.get(("key",), loader), range(8)))
+    assert len(calls) == 1
+    assert all(handle is handles[0] for handle in handles)
+    assert models.get(("key",), loader) is handles[0]
+
+
+def test_failed_load_is_not_cached(registry):
+    models = registry.ModelRegistry()
+    #
+    def failing():
+        raise RuntimeError("boom")
+    #
+    with pytest.raises(RuntimeError):
+        models.get(("key",), failing)
+    assert models.get(("key",), lambda: "handle") == "handle"
+
+
+def test_evict_project_models(registry, monkeypatch):
+    models = registry.ModelRegistry()
+    monkeypatch.setattr(registry, "model_registry", models)
+    for project_id in (1, 2):
+        session = SimpleNamespace(key=(project_id, "gcp", "zone", "fingerprint"))
+        models.get(registry.model_key(session, "chat", "chat-bison"), object)
+    assert registry.evict_project_models(1) == 1
+    assert [key[0][0] for key in models._handles.keys()] == [2]  # pylint: disable=W0212
+
+
+def _session(sessions, name):
+    return sessions.VertexSession((name,), name, "zone", credentials=None)
+
+
+def test_same_session_blocks_share_config(sessions):
+    session = _session(sessions, "a")
+    with session.activated(), session.activated():
+        pass
+    assert [config["project"] for config in sessions.configs] == ["a"]
+
+
+def test_other_session_waits_for_active_block(sessions):
+    first, second = _session(sessions, "a"), _session(sessions, "b")
+    entered = threading.Event()
+    order = []
+    #
+    def hold():
+        with first.activated():
+            entered.set()
+            time.sleep(0.05)
+            order.append("a done")
+    #
+    thread = threading.Thread(target=hold)
+    thread.start()
+    entered.wait()
+    with second.activated():
+        order.append("b active")
+    thread.join()
+    assert order == ["a done", "b active"]
+    assert [config["project"] for config in sessions.configs] == ["a", "b"]
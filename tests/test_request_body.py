@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" translate_messages/parse_chat_request keep the output of the original prepare_data loop """
+
+import dataclasses
+import importlib
+import random
+
+import pytest
+
+
+@pytest.fixture
+def request_body(plugin):  # pylint: disable=W0613
+    pytest.importorskip("vertexai.language_models")
+    return importlib.import_module("vertex_ai.models.request_body")
+
+
+def reference_translate(request_body, messages):
+    """ Original ChatCompletionRequestBody.prepare_data loop """
+    values = {}
+    examples = []
+    message_history = []
+    for idx, message in enumerate(messages):
+        if message['role'] == 'system' and not message.get('name'):
+            values['context'] = message['content']
+        if message.get("name") == "example_user":
+            for j in range(idx + 1, len(messages)):
+                if messages[j].get("name") == "example_assistant":
+                    examples.append({"input_text": message["content"], "output_text": messages[j]["content"]})
+                    break
+        if message['role'] == 'user' and idx != len(messages) - 1:
+            message_history.append({'author': 'user', 'content': message["content"]})
+        if message['role'] == 'assistant':
+            message_history.append({'author': 'bot', 'content': message["content"]})
+    values['examples'] = [request_body.InputOutputTextPair(**item) for item in examples]
+    values['message_history'] = [request_body.ChatMessage(**item) for item in message_history]
+    return values
+
+
+def plain(value):
+    """ Comparable form of translated params, whether items are dataclasses or dicts """
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    if dataclasses.is_dataclass(value):
+        return plain(dataclasses.asdict(value))
+    return value
+
+
+def random_messages(rng):
+    messages = []
+    for idx in range(rng.randint(0, 12)):
+        message = {
+            "role": rng.choice(["system", "user", "assistant"]),
+            "content": f"m{idx}",
+        }
+        if rng.random() < 0.4:
+            message["name"] = rng.choice(["example_user", "example_assistant", "someone"])
+        messages.append(message)
+    return messages
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_translate_messages_matches_reference(request_body, seed):
+    rng = random.Random(seed)
+    for _ in range(400):
+        messages = random_messages(rng)
+        assert plain(request_body.translate_messages(messages)) == plain(reference_translate(request_body, messages))
+
+
+def test_empty_messages(request_body):
+    assert request_body.translate_messages(None) == {"examples": [], "message_history": []}
+    assert request_body.translate_messages([]) == {"examples": [], "message_history": []}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_parse_chat_request_matches_model_validation(request_body, seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        request_data = {
+            "messages": random_messages(rng),
+            "temperature": rng.choice([0, 0.5]),
+            "max_tokens": rng.choice([None, 256]),
+            "stream": False,
+        }
+        expected = request_body.ChatCompletionRequestBody.validate(dict(request_data)).dict(exclude_unset=True)
+        assert plain(request_body.parse_chat_request(request_data)) == plain(expected)
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Circuit breaker, retry budget and retries """
+
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def resilience(plugin, monkeypatch):  # pylint: disable=W0613
+    module = importlib.import_module("vertex_ai.helpers.resilience")
+    monkeypatch.setattr(module, "retry_budget", module.RetryBudget())
+    monkeypatch.setattr(module, "_breakers", {})
+    monkeypatch.setattr(module.time, "sleep", lambda _: None)
+    return module
+
+
+class Flaky:
+    """ Raises errors in order, then returns "ok" """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_breaker_opens_and_probes(resilience, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = resilience.CircuitBreaker(("p", "z", "m"), failure_threshold=2, recovery_timeout=10)
+    breaker.record_failure()
+    assert breaker.state == resilience.CLOSED
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+    assert not breaker.allow()
+    now[0] += 10
+    assert breaker.allow()
+    assert breaker.state == resilience.HALF_OPEN
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_success()
+    assert breaker.state == resilience.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(resilience, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = resilience.CircuitBreaker(("p", "z", "m"), failure_threshold=1, recovery_timeout=10)
+    breaker.record_failure()
+    now[0] += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+    assert not breaker.allow()
+
+
+def test_budget_limits_retries(resilience):
+    budget = resilience.RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_request()
+    budget.record_request()
+    assert budget.try_spend()
+    assert budget.info()["exhausted"] == 1
+
+
+def test_retryable_error_is_retried(resilience):
+    call = Flaky(ConnectionError("reset"))
+    assert resilience.call_with_retries(("p", "z", "m"), call, retries=2) == "ok"
+    assert call.calls == 2
+    assert resilience.get_breaker(("p", "z", "m")).state == resilience.CLOSED
+
+
+def test_retries_stop_at_limit(resilience):
+    call = Flaky(*[ConnectionError(str(idx)) for idx in range(5)])
+    with pytest.raises(ConnectionError, match="2"):
+        resilience.call_with_retries(("p", "z", "m"), call, retries=2)
+    assert call.calls == 3
+
+
+def test_open_breaker_stops_retries_with_upstream_error(resilience):
+    key = ("p", "z", "m")
+    resilience._breakers[key] = resilience.CircuitBreaker(key, failure_threshold=2)  # pylint: disable=W0212
+    call = Flaky(*[ConnectionError(str(idx)) for idx in range(5)])
+    with pytest.raises(ConnectionError, match="1"):
+        resilience.call_with_retries(key, call, retries=5)
+    assert call.calls == 2
+    assert resilience.retry_budget.tokens == resilience.BUDGET_MAX_TOKENS - 1
+    with pytest.raises(resilience.CircuitOpen):
+        resilience.call_with_retries(key, call, retries=5)
+    assert call.calls == 2
+
+
+def test_local_error_releases_probe(resilience, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    key = ("p", "z", "m")
+    breaker = resilience._breakers[key] = resilience.CircuitBreaker(  # pylint: disable=W0212
+        key, failure_threshold=1, recovery_timeout=10,
+    )
+    breaker.record_failure()
+    now[0] += 10
+    with pytest.raises(ValueError):
+        resilience.call_with_retries(key, Flaky(ValueError("bad input")))
+    assert breaker.state == resilience.HALF_OPEN
+    assert resilience.call_with_retries(key, Flaky()) == "ok"
+    assert breaker.state == resilience.CLOSED
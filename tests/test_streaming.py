@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2024 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Stream chunk coalescing """
+
+import importlib
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def streaming(plugin):  # pylint: disable=W0613
+    return importlib.import_module("vertex_ai.helpers.streaming")
+
+
+def chunks(items, delay=0.0, error=None, closed=None):
+    try:
+        for item in items:
+            if delay:
+                time.sleep(delay)
+            yield item
+        if error is not None:
+            raise error
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+def test_disabled_passes_chunks_through(streaming):
+    assert list(streaming.coalesce(chunks(["a", "b", "c"]), min_bytes=0)) == ["a", "b", "c"]
+
+
+def test_small_chunks_are_merged(streaming):
+    result = list(streaming.coalesce(chunks(["first"] + ["ab"] * 6), min_bytes=4, max_hold=5))
+    assert result[0] == "first"
+    assert "".join(result) == "first" + "ab" * 6
+    assert result[1:] == ["abab"] * 3
+
+
+def test_held_chunks_flush_after_max_hold(streaming):
+    result = list(streaming.coalesce(chunks(["a", "b", "c"], delay=0.05), min_bytes=100, max_hold=0.01))
+    assert result == ["a", "b", "c"]
+
+
+def test_error_is_raised_after_buffered_text(streaming):
+    stream = streaming.coalesce(chunks(["a", "b"], error=ConnectionError("reset")), min_bytes=100, max_hold=5)
+    assert next(stream) == "a"
+    assert next(stream) == "b"
+    with pytest.raises(ConnectionError):
+        next(stream)
+
+
+def test_early_close_closes_upstream(streaming):
+    closed = threading.Event()
+    stream = streaming.coalesce(chunks(["a"] * 100, delay=0.01, closed=closed), min_bytes=5, max_hold=0.05)
+    assert next(stream) == "a"
+    stream.close()
+    assert closed.wait(1)
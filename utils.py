@@ -1,63 +1,246 @@
-import json
+import asyncio
+import contextvars
 import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import reduce
-from importlib import reload
+from itertools import islice
 from collections import deque
-from typing import Any
+from traceback import format_exc
+from typing import Any, TYPE_CHECKING
 
 from .models.integration_pd import IntegrationModel, MessageModel
-from .models.request_body import ChatCompletionRequestBody, CompletionRequestBody
-
-from google.cloud import aiplatform
-import vertexai
-from vertexai.language_models import ChatModel, InputOutputTextPair, TextGenerationModel, TextGenerationResponse, ChatMessage
-from google.oauth2.service_account import Credentials
-import tiktoken
+from .helpers.sessions import get_session
+from .helpers.tokenizer import count_tokens, count_tokens_batch, get_encoding
+from .helpers.registry import model_registry, model_key
+from .helpers.aio import event_loop
+from .helpers.response_cache import get_response_cache, request_fingerprint
+from .helpers.failover import candidate_zones, pick_zone, call_with_failover, call_hedged, acall_with_failover
+from .helpers import metrics
+from .helpers.streaming import coalesce
+from .helpers.admission import admission
+from .helpers.resilience import call_with_retries, acall_with_retries
 
 from pylon.core.tools import log
 
+# vertexai and request_body (which needs vertexai types) are imported on the
+# direct prediction paths only, so importing utils stays cheap
+if TYPE_CHECKING:
+    from vertexai.language_models import TextGenerationResponse
+
+
+def _import_sdk():
+    from vertexai import language_models  # pylint: disable=C0415,W0611
+    from .models import request_body  # pylint: disable=C0415,W0611
+
+
+def warm_up_parts() -> dict:
+    """Process-wide warm-up steps by name. Sessions and model handles are keyed by the calling
+    project, which is only known per request, so they are not warmed ahead of it.
+    """
+    return {
+        'vertexai_sdk': _import_sdk,
+        'tokenizer': get_encoding,
+    }
+
+
+def warm_up():
+    """Import Vertex AI SDK and load tokenizer data ahead of the first request.
+    """
+    for part in warm_up_parts().values():
+        part()
+
+
+def parse_settings(settings) -> IntegrationModel:
+    with metrics.phase('settings_parse'):
+        settings = IntegrationModel.parse_cached(settings)
+    metrics.register_models(settings.model_index)
+    return settings
+
+
+def init_vertex(project_id: int, settings: IntegrationModel, zone: str = None):
+    # model handles carry their own credentials, the vertexai global config
+    # is only switched while resolving them (see _load_model)
+    with metrics.phase('session_init'):
+        return get_session(project_id, settings, zone)
+
+
+def _texts(responses):
+    """Text of streamed responses, closing the upstream stream when closed early.
+    """
+    try:
+        for resp in responses:
+            yield resp.text
+    finally:
+        close = getattr(responses, 'close', None)
+        if close is not None:
+            close()
+
+
+def coalesce_stream(settings: IntegrationModel, texts):
+    return coalesce(texts, settings.stream_min_chunk_bytes, settings.stream_max_hold_ms / 1000)
+
+
+def _stream_response(model_name: str, texts) -> Any:
+    created = int(time.time())
+    return (
+        prepare_azure_response(model_name=model_name, text=text, stream=True, chat=True, created=created)
+        for text in texts
+    )
+
+
+def admit(session, settings: IntegrationModel, model_name: str, input_tokens: int, max_output_tokens=None) -> None:
+    """Wait for local RPM/TPM quota of (GCP project, region, model), AdmissionRejected past admission_timeout.
+    """
+    if not settings.quota_requests_per_minute and not settings.quota_tokens_per_minute:
+        return
+    if not max_output_tokens:
+        max_output_tokens = settings.get_output_token_limit(model_name)
+    with metrics.phase('admission'):
+        admission.acquire(
+            (settings.project, session.location, model_name),
+            rpm=settings.quota_requests_per_minute,
+            tpm=settings.quota_tokens_per_minute,
+            tokens=input_tokens + max_output_tokens,
+            timeout=settings.admission_timeout,
+        )
+
+
+async def aadmit(session, settings: IntegrationModel, model_name: str, input_tokens: int, max_output_tokens=None) -> None:
+    """Async admit(), waits on the event loop instead of holding a thread.
+    """
+    if not settings.quota_requests_per_minute and not settings.quota_tokens_per_minute:
+        return
+    if not max_output_tokens:
+        max_output_tokens = settings.get_output_token_limit(model_name)
+    with metrics.phase('admission'):
+        await admission.acquire_async(
+            (settings.project, session.location, model_name),
+            rpm=settings.quota_requests_per_minute,
+            tpm=settings.quota_tokens_per_minute,
+            tokens=input_tokens + max_output_tokens,
+            timeout=settings.admission_timeout,
+        )
+
+
+def _requested_output_tokens(request_data: dict):
+    return request_data.get('max_output_tokens') or request_data.get('max_tokens')
+
+
+def preferred_zone(settings: IntegrationModel) -> str:
+    return pick_zone(settings.project, settings.zone, settings.fallback_zones)
+
+
+def call_in_zones(project_id: int, settings: IntegrationModel, call, model_name: str = None):
+    """Run call(session) in integration zone, failing over to fallback_zones on retryable errors.
+    Every zone attempt is guarded by the model/zone circuit breaker and retried with backoff.
+    """
+    zones = candidate_zones(settings.project, settings.zone, settings.fallback_zones)
+    model_name = model_name or settings.model_name
+
+    def _zone_call(zone):
+        return call_with_retries(
+            (settings.project, zone, model_name),
+            lambda: call(init_vertex(project_id, settings, zone)),
+            retries=settings.max_retries,
+            base_delay=settings.retry_base_delay,
+        )
+
+    if settings.hedging:
+        return call_hedged(settings.project, zones, _zone_call, settings.hedge_min_delay)
+    return call_with_failover(settings.project, zones, _zone_call)
+
+
+def _language_models():
+    from vertexai import language_models  # pylint: disable=C0415
+    return language_models
+
+
+def _load_model(session, loader, model_name, tuned_model_name=''):
+    # handles capture project/credentials from the global vertexai config,
+    # no other session may switch it until they are built
+    with session.activated():
+        model = loader(model_name)
+        if tuned_model_name:
+            model = model.get_tuned_model(tuned_model_name)
+    return model
+
 
-def init_vertex(project_id: int, settings: IntegrationModel) -> None:
-    reload(vertexai.preview.initializer)
-    # service_account = SecretString(settings.service_account_info)
-    # service_info = json.loads(service_account.unsecret(project_id))
-    # credentials = Credentials.from_service_account_info(service_info)
-    service_account_json = json.loads(settings.service_account_info.unsecret(project_id))
-    credentials = Credentials.from_service_account_info(service_account_json)
-    vertexai.init(
-        project=settings.project,
-        location=settings.zone,
-        credentials=credentials
+def get_chat_model(session, model_name: str):
+    return model_registry.get(
+        model_key(session, 'chat', model_name),
+        lambda: _load_model(session, _language_models().ChatModel.from_pretrained, model_name)
+    )
+
+
+def get_text_model(session, model_name: str, tuned_model_name: str = ''):
+    return model_registry.get(
+        model_key(session, 'text', model_name, tuned_model_name),
+        lambda: _load_model(
+            session, _language_models().TextGenerationModel.from_pretrained, model_name, tuned_model_name
+        )
     )
 
 
 def num_tokens_from_text(text: str) -> int:
     """Return the number of tokens used by text.
     """
-    encoding = tiktoken.get_encoding("cl100k_base")  # Using cl100k_base encoding
-    return len(encoding.encode(text))
+    return count_tokens(text)
+
+
+TOKENS_PER_MESSAGE = 4
+HISTORY_CHUNK_SIZE = 16
+BATCH_CONCURRENCY = 16
+
+
+def _message_segments(message: Any) -> tuple:
+    if isinstance(message, str):
+        return (message,)
+    if isinstance(message, dict):
+        return tuple(message.values())
+    language_models = _language_models()
+    if isinstance(message, language_models.InputOutputTextPair):
+        return (message.input_text, message.output_text)
+    if isinstance(message, language_models.ChatMessage):
+        return (message.author, message.content)
+    return ()
+
+
+def _canonical_message(message: Any) -> Any:
+    """Convert {'role', 'content'} dict to MessageModel shape without a pydantic round trip.
+    """
+    if not isinstance(message, dict):
+        return message
+    role, content = message.get('role'), message.get('content')
+    if type(role) is str and type(content) is str:  # pylint: disable=C0123
+        return {'author': 'bot' if role == 'ai' else role, 'content': content}
+    return MessageModel(**message).dict()
+
+
+def _canonical_chunk(messages) -> tuple:
+    """Canonical messages up to the first malformed one, and its error.
+    """
+    result = []
+    for message in messages:
+        try:
+            result.append(_canonical_message(message))
+        except Exception as e:  # pylint: disable=W0703
+            return result, e
+    return result, None
 
 
 def num_tokens_from_messages(message: Any) -> int:
     """Return the number of tokens used by messages.
     """
-    encoding = tiktoken.get_encoding("cl100k_base")  # Using cl100k_base encoding
-    tokens_per_message = 4
-    num_tokens = 0
-    if isinstance(message, str):
-        num_tokens = len(encoding.encode(message))
-    elif isinstance(message, InputOutputTextPair):
-        num_tokens += len(encoding.encode(message.input_text))
-        num_tokens += len(encoding.encode(message.output_text))
-    elif isinstance(message, ChatMessage):
-        num_tokens += len(encoding.encode(message.author))
-        num_tokens += len(encoding.encode(message.content))
-    elif isinstance(message, dict):
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
     # num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
-    num_tokens += tokens_per_message
-    return num_tokens
+    return sum(map(count_tokens, _message_segments(message))) + TOKENS_PER_MESSAGE
+
+
+def num_tokens_from_message_list(messages: list) -> list:
+    """Return the number of tokens used by each message, encoding all of them in one batch.
+    """
+    segments = [_message_segments(message) for message in messages]
+    counts = iter(count_tokens_batch([text for parts in segments for text in parts]))
+    return [sum(next(counts) for _ in parts) + TOKENS_PER_MESSAGE for parts in segments]
 
 
 def prepare_conversation(prompt_struct: dict, token_input_limit: int) -> dict:
@@ -69,37 +252,42 @@ def prepare_conversation(prompt_struct: dict, token_input_limit: int) -> dict:
     }
     tokens_left = token_input_limit
 
+    required = []
     if prompt_struct.get('context'):
-        context_tokens = num_tokens_from_messages(prompt_struct['context'])
-        tokens_left -= context_tokens
-        if tokens_left < 0:
-            return conversation, tokens_left
-        conversation['context'] = prompt_struct['context']
-
+        required.append(('context', prompt_struct['context']))
     if prompt_struct.get('prompt'):
-        input_tokens = num_tokens_from_messages(prompt_struct['prompt'])
-        tokens_left -= input_tokens
+        required.append(('prompt', prompt_struct['prompt']))
+    if prompt_struct.get('examples'):
+        required.extend(('examples', example) for example in prompt_struct['examples'])
+
+    tokens = num_tokens_from_message_list([item for _, item in required])
+    for (key, item), item_tokens in zip(required, tokens):
+        tokens_left -= item_tokens
         if tokens_left < 0:
             return conversation, tokens_left
-        conversation['prompt'] = prompt_struct['prompt']
-
-    if prompt_struct.get('examples'):
-        for example in prompt_struct['examples']:
-            example_tokens = num_tokens_from_messages(example)
-            tokens_left -= example_tokens
-            if tokens_left < 0:
-                return conversation, tokens_left
-            conversation['examples'].append(example)
+        if key == 'examples':
+            conversation['examples'].append(item)
+        else:
+            conversation[key] = item
 
     if prompt_struct.get('chat_history'):
-        for message in reversed(prompt_struct['chat_history']):
-            if isinstance(message, dict):
-                message = MessageModel(**message).dict()
-            message_tokens = num_tokens_from_messages(message)
-            tokens_left -= message_tokens
-            if tokens_left < 0:
-                break
-            conversation['chat_history'].appendleft(message)
+        # newest first, counted in growing batches so messages past the cut are never touched
+        history = reversed(prompt_struct['chat_history'])
+        chunk_size = HISTORY_CHUNK_SIZE
+        while True:
+            messages, error = _canonical_chunk(islice(history, chunk_size))
+            for message, message_tokens in zip(messages, num_tokens_from_message_list(messages)):
+                tokens_left -= message_tokens
+                if tokens_left < 0:
+                    break
+                conversation['chat_history'].appendleft(message)
+            else:
+                if error is not None:
+                    raise error
+                if len(messages) == chunk_size:
+                    chunk_size *= 2
+                    continue
+            break
 
     if len(conversation['chat_history']) % 2:
         conversation['chat_history'].popleft()
@@ -114,19 +302,16 @@ def prepare_conversation_from_request(params, input_, input_token_limit):
         'chat_history': params['message_history'],
         'prompt': input_
     }
-    conversation, tokens_left = prepare_conversation(prompt_struct, input_token_limit)
+    with metrics.phase('tokenization'):
+        conversation, tokens_left = prepare_conversation(prompt_struct, input_token_limit)
     params['context'] = conversation['context']
     params['examples'] = conversation['examples']
     params['message_history'] = conversation['chat_history']
     return params, prompt_struct['prompt'], tokens_left
 
 
-def predict_chat(project_id: int, settings: dict, prompt_struct: dict, stream=False) -> str:
-    settings = IntegrationModel.parse_obj(settings)
-
-    init_vertex(project_id, settings)
-
-    chat_model = ChatModel.from_pretrained(settings.model_name)
+def _start_chat(session, settings: IntegrationModel, prompt_struct: dict, stream=False):
+    chat_model = get_chat_model(session, settings.model_name)
     params = {
         "temperature": settings.temperature,
         "top_k":settings.top_k,
@@ -136,17 +321,20 @@ def predict_chat(project_id: int, settings: dict, prompt_struct: dict, stream=Fa
         params["max_output_tokens"] = settings.max_decode_steps
 
     input_token_limit = settings.input_token_limit
-    prompt_struct, tokens_left = prepare_conversation(prompt_struct, input_token_limit)
+    with metrics.phase('tokenization'):
+        prompt_struct, tokens_left = prepare_conversation(prompt_struct, input_token_limit)
+    admit(session, settings, settings.model_name, input_token_limit - tokens_left, settings.max_decode_steps)
 
+    language_models = _language_models()
     if prompt_struct.get('chat_history'):
-        chat_history = list(map(lambda x: ChatMessage(**x), prompt_struct['chat_history']))
+        chat_history = list(map(lambda x: language_models.ChatMessage(**x), prompt_struct['chat_history']))
     else:
         chat_history = None
 
     chat = chat_model.start_chat(
         context=prompt_struct['context'],
         examples=list(map(
-            lambda i: InputOutputTextPair(
+            lambda i: language_models.InputOutputTextPair(
                 input_text=i['input'],
                 output_text=i['output']
             ),
@@ -155,82 +343,321 @@ def predict_chat(project_id: int, settings: dict, prompt_struct: dict, stream=Fa
         message_history=chat_history,
         **params
     )
-    if stream:
-        responses = chat.send_message_streaming(prompt_struct['prompt'])
-        result = reduce(lambda x, y: x + y.text , responses, "")
-        return result
-    else:
-        chat_response: TextGenerationResponse = chat.send_message(prompt_struct['prompt'])
-        log.info('chat_response %s', chat_response)
-        return chat_response.text
+    return chat, prompt_struct['prompt']
 
 
-def predict_chat_from_request(project_id: int, settings: dict, request_data: dict) -> str:
-    settings = IntegrationModel.parse_obj(settings)
+def predict_chat(project_id: int, settings: dict, prompt_struct: dict, stream=False) -> str:
+    settings = parse_settings(settings)
+
+    def _predict(session):
+        chat, prompt = _start_chat(session, settings, prompt_struct, stream)
+        with metrics.phase('upstream'):
+            if stream:
+                responses = chat.send_message_streaming(prompt)
+                result = reduce(lambda x, y: x + y.text , responses, "")
+                return result
+            else:
+                chat_response: 'TextGenerationResponse' = chat.send_message(prompt)
+                log.info('chat_response %s', chat_response)
+                return chat_response.text
+
+    return call_in_zones(project_id, settings, _predict)
+
+
+class _StreamTimer:
+    """Time to first token since started and inter-chunk gaps of one stream.
+    """
+
+    def __init__(self, model_name: str, started: float):
+        self.model_name = model_name
+        self.label = metrics.model_label(model_name)
+        self.started = started
+        self.operation = metrics.current_operation.get()
+        self.last = None
+
+    def tick(self):
+        now = time.perf_counter()
+        if self.last is None:
+            log.info('Time to first token for %s: %.3fs', self.model_name, now - self.started)
+            metrics.time_to_first_token.observe(now - self.started, operation=self.operation, model=self.label)
+        else:
+            metrics.inter_chunk_gap.observe(now - self.last, operation=self.operation, model=self.label)
+        self.last = now
+
+
+def track_stream(model_name: str, chunks, started: float):
+    """Pass chunks through, recording time to first token since started and inter-chunk gaps.
+    """
+    timer = _StreamTimer(model_name, started)
+
+    def _track():
+        for chunk in chunks:
+            timer.tick()
+            yield chunk
+
+    return _track()
 
-    init_vertex(project_id, settings)
 
+def predict_chat_stream(project_id: int, settings: dict, prompt_struct: dict):
+    """Start chat and return generator of text chunks as they arrive.
+    """
+    started = time.perf_counter()
+    settings = parse_settings(settings)
+    session = init_vertex(project_id, settings, preferred_zone(settings))
+    chat, prompt = _start_chat(session, settings, prompt_struct, stream=True)
+    responses = chat.send_message_streaming(prompt)
+    texts = coalesce_stream(settings, _texts(responses))
+    return track_stream(settings.model_name, texts, started)
+
+
+def _response_cache_key(session, settings: IntegrationModel, request_data: dict, *parts):
+    """Cache key of deterministic (temperature == 0) non-stream request, None if not cacheable.
+    Scoped by (project_id, GCP project) only, so entries are shared by fallback zones.
+    """
+    if not settings.response_cache or request_data['stream'] or request_data.get('temperature') != 0:
+        return None
+    return request_fingerprint(session.key[:2], request_data['deployment_id'], settings.tuned_model_name, *parts)
+
+
+def _cached_response(cache_key, model_name: str, chat: bool):
+    if cache_key is None:
+        return None
+    cached = get_response_cache().get(cache_key)
+    if cached is None:
+        return None
+    return prepare_azure_response(model_name=model_name, **cached, stream=False, chat=chat, cached=True)
+
+
+def _cache_response(cache_key, settings: IntegrationModel, response: dict) -> dict:
+    if cache_key is not None:
+        get_response_cache().set(cache_key, {
+            'text': response['choices'][0]['message']['content'],
+            'input_token_usage': response['usage']['prompt_tokens'],
+            'output_token_usage': response['usage']['completion_tokens'],
+        }, settings.response_cache_ttl)
+    return response
+
+
+def _prepare_chat_request(session, settings: IntegrationModel, request_data: dict):
     model_name = request_data['deployment_id']
-    stream = request_data['stream']
     if request_data.get('messages') and request_data['messages'][-1]['role'] == 'user':
         input_ = request_data['messages'][-1]['content']
     else:
         input_ = ''
 
-    chat_model = ChatModel.from_pretrained(model_name)
-    params = ChatCompletionRequestBody.validate(request_data).dict(exclude_unset=True)
+    chat_model = get_chat_model(session, model_name)
+    from .models.request_body import parse_chat_request  # pylint: disable=C0415
+    params = parse_chat_request(request_data)
 
     input_token_limit = settings.get_input_token_limit(model_name)
     params, input_, tokens_left = prepare_conversation_from_request(params, input_, input_token_limit)
+    cache_key = _response_cache_key(session, settings, request_data, 'chat', params, input_)
 
     chat = chat_model.start_chat(**params)
-    if stream:
-        responses = chat.send_message_streaming(input_)
-        result = (prepare_azure_response(
-            model_name=model_name, text=resp.text, stream=True, chat=True) for resp in responses
-            )
-        return result
-    else:
-        chat_response: TextGenerationResponse = chat.send_message(input_)
-        log.info('chat_response %s', chat_response)
+    return chat, input_, input_token_limit - tokens_left, cache_key
+
+
+def _prepare_completion_request(session, settings: IntegrationModel, request_data: dict):
+    from .models.request_body import CompletionRequestBody  # pylint: disable=C0415
+    params = CompletionRequestBody.validate(request_data).dict(exclude_unset=True)
+    cache_key = _response_cache_key(session, settings, request_data, 'completion', params)
+    model = get_text_model(session, request_data['deployment_id'], settings.tuned_model_name)
+    return model, params, cache_key
+
+
+def _chat_response(model_name: str, text: str, input_token_usage: int, elapsed: float) -> dict:
+    with metrics.phase('serialization'):
         response_data = {
             'model_name': model_name,
-            'text': chat_response.text,
-            'input_token_usage': input_token_limit - tokens_left,
-            'output_token_usage': num_tokens_from_text(chat_response.text)
+            'text': text,
+            'input_token_usage': input_token_usage,
+            'output_token_usage': num_tokens_from_text(text)
         }
+        metrics.record_usage(model_name, response_data['input_token_usage'], response_data['output_token_usage'], elapsed)
         return prepare_azure_response(**response_data, stream=False, chat=True)
 
 
-def predict_from_request(project_id: int, settings: dict, request_data: dict) -> str:
-    settings = IntegrationModel.parse_obj(settings)
+def _completion_response(model_name: str, text: str, prompt: str, elapsed: float) -> dict:
+    with metrics.phase('serialization'):
+        response_data = {
+            'model_name': model_name,
+            'text': text,
+            'input_token_usage': num_tokens_from_text(prompt),
+            'output_token_usage': num_tokens_from_text(text)
+        }
+        metrics.record_usage(model_name, response_data['input_token_usage'], response_data['output_token_usage'], elapsed)
+        return prepare_azure_response(**response_data, stream=False, chat=False)
+
 
-    init_vertex(project_id, settings)
+def predict_chat_from_request(project_id: int, settings: dict, request_data: dict) -> str:
+    settings = parse_settings(settings)
 
     model_name = request_data['deployment_id']
-    stream = request_data['stream']
-    params = CompletionRequestBody.validate(request_data).dict(exclude_unset=True)
 
-    model = TextGenerationModel.from_pretrained(model_name)
-    if settings.tuned_model_name:
-        model = model.get_tuned_model(settings.tuned_model_name)
+    if request_data['stream']:
+        started = time.perf_counter()
+        session = init_vertex(project_id, settings, preferred_zone(settings))
+        chat, input_, input_token_usage, _ = _prepare_chat_request(session, settings, request_data)
+        admit(session, settings, model_name, input_token_usage, _requested_output_tokens(request_data))
+        responses = chat.send_message_streaming(input_)
+        result = _stream_response(model_name, coalesce_stream(settings, _texts(responses)))
+        return track_stream(model_name, result, started)
+
+    def _predict(session):
+        chat, input_, input_token_usage, cache_key = _prepare_chat_request(session, settings, request_data)
+        cached = _cached_response(cache_key, model_name, chat=True)
+        if cached is not None:
+            return cached
+        admit(session, settings, model_name, input_token_usage, _requested_output_tokens(request_data))
+        with metrics.phase('upstream') as upstream:
+            chat_response: 'TextGenerationResponse' = chat.send_message(input_)
+        log.info('chat_response %s', chat_response)
+        return _cache_response(
+            cache_key, settings, _chat_response(model_name, chat_response.text, input_token_usage, upstream.elapsed)
+        )
 
-    if stream:
+    return call_in_zones(project_id, settings, _predict, model_name)
+
+
+def predict_from_request(project_id: int, settings: dict, request_data: dict) -> str:
+    settings = parse_settings(settings)
+
+    model_name = request_data['deployment_id']
+
+    if request_data['stream']:
+        started = time.perf_counter()
+        session = init_vertex(project_id, settings, preferred_zone(settings))
+        model, params, _ = _prepare_completion_request(session, settings, request_data)
+        admit(session, settings, model_name, num_tokens_from_text(params.get('prompt', '')), params.get('max_output_tokens'))
         responses = model.predict_streaming(**params)
-        result = (prepare_azure_response(
-            model_name=model_name, text=resp.text, stream=True, chat=True) for resp in responses
-            )
-        return result
-    else:
-        response: TextGenerationResponse = model.predict(**params)
+        result = _stream_response(model_name, coalesce_stream(settings, _texts(responses)))
+        return track_stream(model_name, result, started)
+
+    def _predict(session):
+        model, params, cache_key = _prepare_completion_request(session, settings, request_data)
+        cached = _cached_response(cache_key, model_name, chat=False)
+        if cached is not None:
+            return cached
+        admit(session, settings, model_name, num_tokens_from_text(params.get('prompt', '')), params.get('max_output_tokens'))
+        with metrics.phase('upstream') as upstream:
+            response: 'TextGenerationResponse' = model.predict(**params)
         log.info('completion_response %s', response)
-        response_data = {
-            'model_name': model_name,
-            'text': response.text,
-            'input_token_usage': num_tokens_from_text(params.get('prompt', '')),
-            'output_token_usage': num_tokens_from_text(response.text)
-        }
-        return prepare_azure_response(**response_data, stream=False, chat=False)
+        return _cache_response(
+            cache_key, settings,
+            _completion_response(model_name, response.text, params.get('prompt', ''), upstream.elapsed)
+        )
+
+    return call_in_zones(project_id, settings, _predict, model_name)
+
+
+BLOCKING_THREADS = 32
+_blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_THREADS, thread_name_prefix='vertex_ai-blocking')
+
+
+async def _run_blocking(func, *args):
+    """Run short blocking work (session init, request preparation) on a pool of its own,
+    so it never competes with other users of the default executor.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_blocking_executor, context.run, func, *args)
+
+
+async def _acall_in_zones(project_id: int, settings: IntegrationModel, request_data: dict, call):
+    async def _call(zone):
+        session = await _run_blocking(init_vertex, project_id, settings, zone)
+        return await call(session)
+
+    async def _zone_call(zone):
+        return await acall_with_retries(
+            (settings.project, zone, request_data['deployment_id']),
+            lambda: _call(zone),
+            retries=settings.max_retries,
+            base_delay=settings.retry_base_delay,
+        )
+
+    zones = candidate_zones(settings.project, settings.zone, settings.fallback_zones)
+    return await acall_with_failover(settings.project, zones, _zone_call)
+
+
+async def achat_from_request(project_id: int, settings: IntegrationModel, request_data: dict):
+    """Async non-stream chat completion for already parsed settings.
+    """
+    model_name = request_data['deployment_id']
+
+    async def _predict(session):
+        chat, input_, input_token_usage, cache_key = await _run_blocking(
+            _prepare_chat_request, session, settings, request_data
+        )
+        cached = _cached_response(cache_key, model_name, chat=True)
+        if cached is not None:
+            return cached
+        await aadmit(session, settings, model_name, input_token_usage, _requested_output_tokens(request_data))
+        with metrics.phase('upstream') as upstream:
+            chat_response: 'TextGenerationResponse' = await chat.send_message_async(input_)
+        log.info('chat_response %s', chat_response)
+        return _cache_response(
+            cache_key, settings, _chat_response(model_name, chat_response.text, input_token_usage, upstream.elapsed)
+        )
+
+    return await _acall_in_zones(project_id, settings, request_data, _predict)
+
+
+async def acompletion_from_request(project_id: int, settings: IntegrationModel, request_data: dict):
+    """Async non-stream text completion for already parsed settings.
+    """
+    model_name = request_data['deployment_id']
+
+    async def _predict(session):
+        model, params, cache_key = await _run_blocking(
+            _prepare_completion_request, session, settings, request_data
+        )
+        cached = _cached_response(cache_key, model_name, chat=False)
+        if cached is not None:
+            return cached
+        await aadmit(
+            session, settings, model_name,
+            num_tokens_from_text(params.get('prompt', '')), params.get('max_output_tokens')
+        )
+        with metrics.phase('upstream') as upstream:
+            response: 'TextGenerationResponse' = await model.predict_async(**params)
+        log.info('completion_response %s', response)
+        return _cache_response(
+            cache_key, settings,
+            _completion_response(model_name, response.text, params.get('prompt', ''), upstream.elapsed)
+        )
+
+    return await _acall_in_zones(project_id, settings, request_data, _predict)
+
+
+async def _predict_batch(predict, project_id: int, settings: IntegrationModel, requests: list, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _predict_item(request_data):
+        async with semaphore:
+            try:
+                response = await predict(project_id, settings, {**request_data, 'stream': False})
+            except Exception as e:  # pylint: disable=W0718
+                log.error(format_exc())
+                return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+            return {"ok": True, "response": response}
+
+    return await asyncio.gather(*map(_predict_item, requests))
+
+
+def predict_chat_batch(project_id: int, settings: dict, requests: list, concurrency: int = BATCH_CONCURRENCY) -> list:
+    """Run chat completions with bounded concurrency, results are in request order.
+    """
+    settings = parse_settings(settings)
+    init_vertex(project_id, settings, preferred_zone(settings))
+    return event_loop.run(_predict_batch(achat_from_request, project_id, settings, requests, concurrency))
+
+
+def predict_batch(project_id: int, settings: dict, requests: list, concurrency: int = BATCH_CONCURRENCY) -> list:
+    """Run text completions with bounded concurrency, results are in request order.
+    """
+    settings = parse_settings(settings)
+    init_vertex(project_id, settings, preferred_zone(settings))
+    return event_loop.run(_predict_batch(acompletion_from_request, project_id, settings, requests, concurrency))
 
 
 def _prerare_text_prompt(prompt_struct):
@@ -244,29 +671,47 @@ def _prerare_text_prompt(prompt_struct):
     return prompt_struct['context']
 
 
-def predict_text(project_id: int, settings: dict, prompt_struct: dict) -> str:
-    settings = IntegrationModel.parse_obj(settings)
+def _text_params(settings: IntegrationModel) -> dict:
+    return {
+        "temperature": settings.temperature,
+        "max_output_tokens": settings.max_decode_steps,
+        "top_k": settings.top_k,
+        "top_p": settings.top_p,
+    }
 
-    init_vertex(project_id, settings)
 
-    model = TextGenerationModel.from_pretrained(settings.model_name)
-    if settings.tuned_model_name:
-        model = model.get_tuned_model(settings.tuned_model_name)
+def predict_text(project_id: int, settings: dict, prompt_struct: dict) -> str:
+    settings = parse_settings(settings)
 
     text_prompt = _prerare_text_prompt(prompt_struct)
+    params = _text_params(settings)
 
-    response = model.predict(
-        text_prompt,
-        temperature=settings.temperature,
-        max_output_tokens=settings.max_decode_steps,
-        top_k=settings.top_k,
-        top_p=settings.top_p,
-    )
+    def _predict(session):
+        model = get_text_model(session, settings.model_name, settings.tuned_model_name)
+        admit(session, settings, settings.model_name, num_tokens_from_text(text_prompt), params['max_output_tokens'])
+        with metrics.phase('upstream'):
+            return model.predict(text_prompt, **params)
+
+    response = call_in_zones(project_id, settings, _predict)
 
     log.info('completion_response %s', response)
     return response.text
 
 
+def predict_text_stream(project_id: int, settings: dict, prompt_struct: dict):
+    """Return generator of text completion chunks as they arrive.
+    """
+    started = time.perf_counter()
+    settings = parse_settings(settings)
+    session = init_vertex(project_id, settings, preferred_zone(settings))
+    model = get_text_model(session, settings.model_name, settings.tuned_model_name)
+    text_prompt = _prerare_text_prompt(prompt_struct)
+    admit(session, settings, settings.model_name, num_tokens_from_text(text_prompt), settings.max_decode_steps)
+    responses = model.predict_streaming(text_prompt, **_text_params(settings))
+    texts = coalesce_stream(settings, _texts(responses))
+    return track_stream(settings.model_name, texts, started)
+
+
 def prepare_result(text):
     structured_result = {'messages': []}
     structured_result['messages'].append({
@@ -279,7 +724,7 @@ def prepare_result(text):
 def prepare_azure_response(stream=False, chat=False, **kwargs):
     response =  {
         "object": "chat.completion" if chat else "completion",
-        "created": int(time.time()),
+        "created": kwargs.get('created') or int(time.time()),
         "model": kwargs.get('model_name'),
         "choices": [
             {
@@ -303,4 +748,5 @@ def prepare_azure_response(stream=False, chat=False, **kwargs):
             "completion_tokens": kwargs.get('output_token_usage'),
             "total_tokens": kwargs.get('input_token_usage', 0) + kwargs.get('output_token_usage', 0)
         }
+        response['cached'] = kwargs.get('cached', False)
     return response